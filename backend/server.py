@@ -1,15 +1,26 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, HTTPException, Header
+from fastapi.responses import Response, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, OperationFailure, PyMongoError
 import os
+import asyncio
+import hashlib
+import json
 import logging
+import mmap
 import re
+import struct
+import time
+from collections import Counter, deque
+from contextlib import asynccontextmanager
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional
+from typing import List, Optional, Union
 import uuid
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -19,6 +30,8 @@ mongo_url = os.environ['MONGO_URL']
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
 
+PROCESS_START = time.monotonic()
+
 # Create the main app without a prefix
 app = FastAPI()
 
@@ -64,6 +77,10 @@ class ViewRelation(BaseModel):
     min_app_version: Optional[int] = None
     max_app_version: Optional[int] = None
     change_owner: Optional[int] = None
+    join_type: Optional[str] = None
+    join_tables: List[str] = []
+    join_columns: List[str] = []
+    predicate_hash: Optional[str] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class ViewRelationCreate(BaseModel):
@@ -81,6 +98,19 @@ class ViewRelationUpdate(BaseModel):
     relation2: Optional[str] = None
     edge_weight: Optional[int] = None
 
+class Project(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    key: str
+    name: str
+    clone_of: Optional[str] = None
+    clone_version: Optional[int] = None
+    materialized: bool = True
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class ProjectCreate(BaseModel):
+    key: str
+    name: Optional[str] = None
+
 class SqlImportRequest(BaseModel):
     sql: str
 
@@ -91,36 +121,89 @@ class SqlImportResponse(BaseModel):
 
 # ============ SQL PARSER ============
 
-def parse_view_insert(sql: str) -> Optional[dict]:
-    """Parse a Report_View INSERT statement"""
-    # Pattern for: INSERT INTO Report_View (...) VALUES(...);
-    pattern = r"INSERT\s+INTO\s+Report_View\s*\(([^)]+)\)\s*VALUES\s*\(([^)]+)\)"
+def split_sql_statements(sql: str) -> List[str]:
+    """Split a script on semicolons that are not inside quoted values"""
+    statements = []
+    current = ""
+    quote_char = None
+    escaped = False
+    for char in sql:
+        if escaped:
+            escaped = False
+        elif quote_char:
+            if char == '\\':
+                escaped = True
+            # A doubled quote ('') toggles twice, so it stays inside the value
+            elif char == quote_char:
+                quote_char = None
+        elif char in ("'", '"'):
+            quote_char = char
+        elif char == ';':
+            statements.append(current.strip())
+            current = ""
+            continue
+        current += char
+    statements.append(current.strip())
+    return [s for s in statements if s]
+
+def parse_insert(sql: str, table: str) -> Optional[tuple]:
+    """Extract the column names and values of an INSERT into table.
+    
+    Values are strings, or None for NULL. Quoted values may contain commas,
+    parentheses and semicolons. Both a doubled quote and a backslash-escaped one
+    stand for a quote, and a doubled backslash for one backslash; any other
+    backslash is kept as written.
+    """
+    pattern = rf"INSERT\s+INTO\s+{table}\s*\(([^)]+)\)\s*VALUES\s*\("
     match = re.search(pattern, sql, re.IGNORECASE)
     if not match:
         return None
     
     columns = [c.strip().lower() for c in match.group(1).split(',')]
-    values_str = match.group(2)
     
-    # Parse values handling quoted strings
+    # Parse values handling quoted strings, up to the closing parenthesis
     values = []
     current = ""
-    in_string = False
+    quoted = False
     quote_char = None
-    
-    for char in values_str:
-        if char in ("'", '"') and not in_string:
-            in_string = True
+    pos = match.end()
+    while pos < len(sql):
+        char = sql[pos]
+        pos += 1
+        if quote_char:
+            if char == '\\' and sql[pos:pos + 1] in ("'", '"', '\\'):
+                current += sql[pos]
+                pos += 1
+                continue
+            if char == quote_char:
+                if sql[pos:pos + 1] == quote_char:
+                    current += char
+                    pos += 1
+                else:
+                    quote_char = None
+                continue
+            current += char
+        elif char in ("'", '"'):
             quote_char = char
-        elif char == quote_char and in_string:
-            in_string = False
-            quote_char = None
-        elif char == ',' and not in_string:
-            values.append(current.strip())
+            quoted = True
+        elif char in (',', ')'):
+            value = current.strip()
+            values.append(None if not quoted and value.upper() == 'NULL' else value)
             current = ""
-            continue
-        current += char
-    values.append(current.strip())
+            quoted = False
+            if char == ')':
+                return columns, values
+        else:
+            current += char
+    return None
+
+def parse_view_insert(sql: str) -> Optional[dict]:
+    """Parse a Report_View INSERT statement"""
+    # Pattern for: INSERT INTO Report_View (...) VALUES(...);
+    parsed = parse_insert(sql, "Report_View")
+    if not parsed:
+        return None
+    columns, values = parsed
     
     # Build dict
     data = {}
@@ -138,10 +221,8 @@ def parse_view_insert(sql: str) -> Optional[dict]:
         if i < len(values):
             mapped_col = col_mapping.get(col.replace(' ', ''))
             if mapped_col:
-                val = values[i].strip("'\"")
-                if val.upper() == 'NULL':
-                    val = None
-                elif mapped_col in ('view_id', 'min_app_version', 'max_app_version'):
+                val = values[i]
+                if val is not None and mapped_col in ('view_id', 'min_app_version', 'max_app_version'):
                     try:
                         val = int(val)
                     except:
@@ -155,37 +236,14 @@ def parse_view_insert(sql: str) -> Optional[dict]:
     if data.get('max_app_version') is None:
         data['max_app_version'] = 999999
     
-    return data if 'view_id' in data and 'name' in data else None
+    return data if data.get('view_id') is not None and 'name' in data else None
 
 def parse_view_relation_insert(sql: str) -> Optional[dict]:
     """Parse a Report_ViewRelation INSERT statement"""
-    pattern = r"INSERT\s+INTO\s+Report_ViewRelation\s*\(([^)]+)\)\s*VALUES\s*\(([^)]+)\)"
-    match = re.search(pattern, sql, re.IGNORECASE)
-    if not match:
+    parsed = parse_insert(sql, "Report_ViewRelation")
+    if not parsed:
         return None
-    
-    columns = [c.strip().lower() for c in match.group(1).split(',')]
-    values_str = match.group(2)
-    
-    # Parse values handling quoted strings
-    values = []
-    current = ""
-    in_string = False
-    quote_char = None
-    
-    for char in values_str:
-        if char in ("'", '"') and not in_string:
-            in_string = True
-            quote_char = char
-        elif char == quote_char and in_string:
-            in_string = False
-            quote_char = None
-        elif char == ',' and not in_string:
-            values.append(current.strip())
-            current = ""
-            continue
-        current += char
-    values.append(current.strip())
+    columns, values = parsed
     
     # Build dict
     data = {}
@@ -204,10 +262,8 @@ def parse_view_relation_insert(sql: str) -> Optional[dict]:
         if i < len(values):
             mapped_col = col_mapping.get(col.replace(' ', ''))
             if mapped_col:
-                val = values[i].strip("'\"")
-                if val.upper() == 'NULL':
-                    val = None
-                elif mapped_col in ('id_view1', 'id_view2', 'edge_weight', 'min_app_version', 'max_app_version', 'change_owner'):
+                val = values[i]
+                if val is not None and mapped_col in ('id_view1', 'id_view2', 'edge_weight', 'min_app_version', 'max_app_version', 'change_owner'):
                     try:
                         val = int(val)
                     except:
@@ -216,16 +272,1427 @@ def parse_view_relation_insert(sql: str) -> Optional[dict]:
                         val = None
                 data[mapped_col] = val
     
-    return data if 'id_view1' in data and 'id_view2' in data and 'relation' in data else None
+    return data if data.get('id_view1') is not None and data.get('id_view2') is not None and 'relation' in data else None
+
+# ============ JOIN METADATA ============
+
+# Checked in order; getJoinType in the frontend uses the same patterns
+JOIN_TYPE_PATTERNS = [
+    ("LEFT JOIN", r"\bLEFT\s+(?:OUTER\s+)?JOIN\b"),
+    ("RIGHT JOIN", r"\bRIGHT\s+(?:OUTER\s+)?JOIN\b"),
+    ("INNER JOIN", r"\bINNER\s+JOIN\b"),
+    ("CROSS JOIN", r"\bCROSS\s+JOIN\b"),
+    ("FULL JOIN", r"\bFULL\s+(?:OUTER\s+)?JOIN\b"),
+    ("JOIN", r"\bJOIN\b"),
+]
+JOIN_KEYWORDS = {'on', 'using', 'left', 'right', 'inner', 'cross', 'full', 'outer', 'join', 'where'}
+JOIN_FIELDS = ("join_type", "join_tables", "join_columns", "predicate_hash")
+# Where an ON predicate ends: the next clause or the next JOIN
+JOIN_PREDICATE_END = (
+    r"\b(?:WHERE|GROUP\s+BY|ORDER\s+BY|HAVING|LIMIT|UNION)\b"
+    r"|\b(?:(?:LEFT|RIGHT|FULL)(?:\s+OUTER)?\s+|INNER\s+|CROSS\s+)?JOIN\b"
+)
+# Bumped whenever extract_join_metadata changes, so stored relations get re-extracted
+JOIN_PARSER_VERSION = 3
+
+def normalize_join_type(join_type: str) -> str:
+    """Accept e.g. 'full', 'FULL JOIN' or 'left outer join' as filter values"""
+    value = ' '.join(join_type.upper().replace('OUTER', '').split())
+    if value in ('', 'DEFAULT', 'JOIN'):
+        return value or 'DEFAULT'
+    return value if value.endswith(' JOIN') else f"{value} JOIN"
+
+def extract_join_metadata(relation: Optional[str]) -> dict:
+    """Parse a relation's JOIN clause into indexable fields"""
+    text = relation or ''
+    join_type = next(
+        (name for name, pattern in JOIN_TYPE_PATTERNS if re.search(pattern, text, re.IGNORECASE | re.ASCII)),
+        'DEFAULT'
+    )
+    
+    # Ignore anything inside string literals
+    unquoted = re.sub(r"'[^']*'|\"[^\"]*\"", "''", text)
+    
+    join_ref = re.compile(r"\bJOIN\s+([\w$`.]+)(?:\s+(?:AS\s+)?([\w$]+))?", re.IGNORECASE)
+    tables = []
+    aliases = {}
+    for match in join_ref.finditer(unquoted):
+        table = match.group(1).replace('`', '').split('.')[-1].lower()
+        tables.append(table)
+        aliases[table] = table
+        alias = match.group(2)
+        if alias and alias.lower() not in JOIN_KEYWORDS:
+            aliases[alias.lower()] = table
+    
+    # Columns only come from ON predicates, each running up to the next clause or JOIN
+    predicates = []
+    for on_match in re.finditer(r"\bON\b", unquoted, re.IGNORECASE):
+        end_match = re.compile(JOIN_PREDICATE_END, re.IGNORECASE).search(unquoted, on_match.end())
+        predicates.append(unquoted[on_match.end():end_match.start() if end_match else len(unquoted)])
+    
+    columns = []
+    # Qualified references such as Shop.Id or DBCommon.Loc__Country.Alpha3
+    for ref in re.findall(r"[A-Za-z_`][\w$`]*(?:\.[A-Za-z_`][\w$`]*)+", ' '.join(predicates)):
+        parts = [p.lower() for p in ref.replace('`', '').split('.')]
+        columns.append(parts[-1])
+        qualifier = parts[-2]
+        if qualifier in aliases:
+            tables.append(aliases[qualifier])
+        elif len(parts) > 2:
+            # Schema-qualified, so the qualifier is a table even if it is not joined here
+            tables.append(qualifier)
+        # Any other bare qualifier is the other side of the join (often an alias), not a table
+    
+    using_match = re.search(r"\bUSING\s*\(([^)]*)\)", unquoted, re.IGNORECASE)
+    if using_match:
+        columns.extend(c.strip().replace('`', '') for c in using_match.group(1).split(',') if c.strip())
+    
+    # Hash the predicate as written, literals included, so only identical joins collide
+    on_match = re.search(r"\bON\b(.*)", text, re.IGNORECASE | re.DOTALL)
+    normalized = ' '.join((on_match.group(1) if on_match else text).lower().split())
+    return {
+        "join_type": join_type,
+        "join_tables": sorted({t.lower() for t in tables}),
+        "join_columns": sorted({c.lower() for c in columns}),
+        "predicate_hash": hashlib.sha1(normalized.encode()).hexdigest()[:16] if normalized else None
+    }
+
+def join_filter_query(
+    join_type: Optional[str] = None,
+    join_table: Optional[str] = None,
+    join_column: Optional[str] = None,
+    predicate_hash: Optional[str] = None
+) -> dict:
+    """Build an indexed relation query from JOIN metadata filters"""
+    query = {}
+    if join_type:
+        query["join_type"] = normalize_join_type(join_type)
+    if join_table:
+        query["join_tables"] = join_table.lower()
+    if join_column:
+        query["join_columns"] = join_column.lower()
+    if predicate_hash:
+        query["predicate_hash"] = predicate_hash
+    return query
+
+# ============ GRAPH FORMATTING ============
+
+def view_to_node(v: dict) -> dict:
+    """Format a view document as a graph node"""
+    display_name = v.get('alias') or v.get('name', f"View_{v['view_id']}")
+    return {
+        "id": str(v['view_id']),
+        "view_id": v['view_id'],
+        "name": v.get('name', ''),
+        "name2": v.get('name2'),
+        "alias": v.get('alias'),
+        "min_app_version": v.get('min_app_version', 0),
+        "max_app_version": v.get('max_app_version', 999999),
+        "display_name": display_name
+    }
+
+def relation_to_edge(r: dict) -> dict:
+    """Format a relation document as a graph edge"""
+    return {
+        "id": r['id'],
+        "source": str(r['id_view1']),
+        "target": str(r['id_view2']),
+        "relation": r.get('relation', ''),
+        "relation2": r.get('relation2'),
+        "edge_weight": r.get('edge_weight', 10),
+        "join_type": r.get('join_type')
+    }
+
+# ============ PROJECTS ============
+
+DEFAULT_PROJECT = "default"
+PROJECT_KEY_PATTERN = re.compile(r"^[a-z0-9][a-z0-9_-]{0,63}$")
+
+def meta_id(kind: str, project: str) -> str:
+    """graph_meta document id; the default project keeps the ids used before projects existed"""
+    return kind if project == DEFAULT_PROJECT else f"{kind}:{project}"
+
+def meta_project(doc_id: str) -> str:
+    return doc_id.split(':', 1)[1] if ':' in doc_id else DEFAULT_PROJECT
+
+# ============ CHANGE FEED ============
+
+CHANGE_FEED_QUEUE_SIZE = int(os.environ.get('CHANGE_FEED_QUEUE_SIZE', '256'))
+CHANGE_FEED_HISTORY_SIZE = int(os.environ.get('CHANGE_FEED_HISTORY_SIZE', '1000'))
+CHANGE_FEED_MAX_BATCH = int(os.environ.get('CHANGE_FEED_MAX_BATCH', '500'))
+CHANGE_FEED_COALESCE_MS = int(os.environ.get('CHANGE_FEED_COALESCE_MS', '50'))
+CHANGE_FEED_KEEPALIVE_S = int(os.environ.get('CHANGE_FEED_KEEPALIVE_S', '15'))
+
+def view_patch(view: dict) -> dict:
+    return {"op": "upsert", "entity": "view", "key": str(view['view_id']), "data": view_to_node(view)}
+
+def relation_patch(relation: dict) -> dict:
+    return {"op": "upsert", "entity": "relation", "key": relation['id'], "data": relation_to_edge(relation)}
+
+def delete_patch(entity: str, key) -> dict:
+    return {"op": "delete", "entity": entity, "key": str(key)}
+
+def coalesce_patches(events: List[dict]) -> List[dict]:
+    """Collapse a burst of patches so each entity appears once with its latest state"""
+    merged = {}
+    for event in events:
+        op = event['op']
+        if op == 'resync':
+            # The client will refetch everything, nothing else is worth sending
+            return [event]
+        if op == 'reset':
+            merged.clear()
+            merged[('reset', None)] = event
+            continue
+        key = (event['entity'], event['key'])
+        merged.pop(key, None)
+        merged[key] = event
+    return list(merged.values())
+
+class ChangeFeed:
+    """In-process broadcaster of graph patches to change stream subscribers"""
+
+    def __init__(self, queue_size: int, history_size: int, max_batch: int):
+        self.seq = 0
+        self.queue_size = queue_size
+        self.max_batch = max_batch
+        self._history = deque(maxlen=history_size)
+        self._subscribers = set()
+        # Versions published ahead of an earlier one still in flight
+        self._pending = {}
+
+    def publish(self, version: int, patches: List[dict]):
+        """Broadcast one write's patches, strictly in graph version order.
+        
+        A version that arrives ahead of a missing one is held until the gap fills;
+        a resync covers every version up to its own, so it is sent right away.
+        """
+        if not patches or version <= self.seq:
+            return
+        if len(patches) > self.max_batch:
+            # Large bulk writes are cheaper to refetch than to stream
+            patches = [{"op": "resync"}]
+
+        if any(patch['op'] == 'resync' for patch in patches):
+            self._pending = {v: p for v, p in self._pending.items() if v > version}
+            self._broadcast(version, [{"op": "resync"}])
+        else:
+            self._pending[version] = patches
+        while self.seq + 1 in self._pending:
+            self._broadcast(self.seq + 1, self._pending.pop(self.seq + 1))
+
+    def rewind(self, version: int):
+        """Restart the sequence at an older version, e.g. after the database was restored"""
+        self._pending.clear()
+        self._history.clear()
+        self.seq = version
+        for queue in list(self._subscribers):
+            self._overflow(queue)
+
+    def _broadcast(self, version: int, patches: List[dict]):
+        self.seq = version
+        batch = [{**patch, "seq": version} for patch in patches]
+        self._history.extend(batch)
+
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(batch)
+            except asyncio.QueueFull:
+                self._overflow(queue)
+
+    def _overflow(self, queue: asyncio.Queue):
+        """Drop the backlog of a slow subscriber and ask it to refetch"""
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait([{"op": "resync", "seq": self.seq}])
+
+    def subscribe(self, last_seq: Optional[int] = None) -> asyncio.Queue:
+        """Register a subscriber, replaying missed patches when resuming from last_seq"""
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        if last_seq is not None and last_seq != self.seq:
+            oldest = self._history[0]['seq'] if self._history else self.seq + 1
+            # The oldest version may have been cut short by the history limit
+            if last_seq > self.seq or last_seq < oldest:
+                queue.put_nowait([{"op": "resync", "seq": self.seq}])
+            else:
+                queue.put_nowait([e for e in self._history if e['seq'] > last_seq])
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+change_feeds = {}
+
+def get_change_feed(project: str) -> ChangeFeed:
+    if project not in change_feeds:
+        change_feeds[project] = ChangeFeed(CHANGE_FEED_QUEUE_SIZE, CHANGE_FEED_HISTORY_SIZE, CHANGE_FEED_MAX_BATCH)
+    return change_feeds[project]
+
+def format_sse(event: str, seq: int, data: dict) -> str:
+    return f"id: {seq}\nevent: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+async def stream_change_events(feed: ChangeFeed, queue: asyncio.Queue, start_seq: int):
+    """Yield coalesced patch batches as server-sent events until the client disconnects"""
+    try:
+        yield format_sse("ready", start_seq, {"seq": start_seq})
+        while True:
+            try:
+                batch = await asyncio.wait_for(queue.get(), timeout=CHANGE_FEED_KEEPALIVE_S)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+
+            # Give bursts (e.g. several quick edits) a moment to pile up
+            await asyncio.sleep(CHANGE_FEED_COALESCE_MS / 1000)
+            events = list(batch)
+            while not queue.empty():
+                events.extend(queue.get_nowait())
+
+            # Batches are queued in version order; sorting keeps the newest state winning regardless
+            events.sort(key=lambda e: e['seq'])
+            seq = events[-1]['seq']
+            yield format_sse("patch", seq, {"seq": seq, "patches": coalesce_patches(events)})
+    finally:
+        feed.unsubscribe(queue)
+
+# ============ READ COALESCING & LOAD SHEDDING ============
+
+READ_MAX_CONCURRENCY = int(os.environ.get('READ_MAX_CONCURRENCY', '8'))
+READ_MAX_QUEUE = int(os.environ.get('READ_MAX_QUEUE', '64'))
+READ_QUEUE_TIMEOUT_S = float(os.environ.get('READ_QUEUE_TIMEOUT_S', '5'))
+
+class SingleFlight:
+    """Share one in-flight computation between identical concurrent requests"""
+
+    def __init__(self):
+        self.leaders = 0
+        self.joined = 0
+        self._inflight = {}
+
+    async def do(self, key, fn):
+        task = self._inflight.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.joined += 1
+        # Shield so one caller disconnecting does not cancel the others
+        return await asyncio.shield(task)
+
+class ReadLimiter:
+    """Bound concurrent heavy reads, shedding load with 503 once the queue is full"""
+
+    def __init__(self, max_concurrency: int, max_queue: int, queue_timeout_s: float):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout_s = queue_timeout_s
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.shed = 0
+        self.total_queue_ms = 0.0
+        self.max_queue_ms = 0.0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    def _reject(self):
+        self.shed += 1
+        raise HTTPException(
+            status_code=503,
+            detail="Server busy, retry shortly",
+            headers={"Retry-After": "1"}
+        )
+
+    @asynccontextmanager
+    async def slot(self):
+        start = time.monotonic()
+        if not self._semaphore.locked():
+            # A free slot is taken without yielding, so it never counts as queued
+            await self._semaphore.acquire()
+        else:
+            if self.waiting >= self.max_queue:
+                self._reject()
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout_s)
+            except asyncio.TimeoutError:
+                self._reject()
+            finally:
+                self.waiting -= 1
+
+        queue_ms = (time.monotonic() - start) * 1000
+        self.admitted += 1
+        self.total_queue_ms += queue_ms
+        self.max_queue_ms = max(self.max_queue_ms, queue_ms)
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+    def metrics(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "avg_queue_ms": round(self.total_queue_ms / self.admitted, 3) if self.admitted else 0.0,
+            "max_queue_ms": round(self.max_queue_ms, 3)
+        }
+
+read_flight = SingleFlight()
+read_limiter = ReadLimiter(READ_MAX_CONCURRENCY, READ_MAX_QUEUE, READ_QUEUE_TIMEOUT_S)
+
+# ============ GRAPH VERSION & SNAPSHOT ============
+
+GRAPH_SNAPSHOT_PATH = Path(
+    os.environ.get('GRAPH_SNAPSHOT_PATH', ROOT_DIR / f"graph-{os.environ['DB_NAME']}.snapshot")
+)
+GRAPH_MULTI_WORKER = os.environ.get('GRAPH_MULTI_WORKER', 'false').lower() == 'true'
+GRAPH_VERSION_MAX_LAG_MS = int(os.environ.get('GRAPH_VERSION_MAX_LAG_MS', '1000'))
+GRAPH_HISTORY_RETENTION_S = int(os.environ.get('GRAPH_HISTORY_RETENTION_S', '604800'))
+GRAPH_CHECKPOINT_EVERY = int(os.environ.get('GRAPH_CHECKPOINT_EVERY', '200'))
+GRAPH_COMPACTION_INTERVAL_S = int(os.environ.get('GRAPH_COMPACTION_INTERVAL_S', '600'))
+GRAPH_UNDO_DEPTH = int(os.environ.get('GRAPH_UNDO_DEPTH', '100'))
+GRAPH_CHANGE_LOG_MAX_PATCHES = int(os.environ.get('GRAPH_CHANGE_LOG_MAX_PATCHES', '5000'))
+GRAPH_WRITE_LOCK_TTL_S = int(os.environ.get('GRAPH_WRITE_LOCK_TTL_S', '30'))
+GRAPH_WRITE_LOCK_WAIT_S = int(os.environ.get('GRAPH_WRITE_LOCK_WAIT_S', '30'))
+
+# magic, graph version, node count, edge count, body length
+SNAPSHOT_MAGIC = b'RGVSNAP2'
+SNAPSHOT_HEADER = struct.Struct('<8sQIIQ')
+
+async def read_graph_version(project: str) -> int:
+    """Get the project's graph version stored in its control document"""
+    meta = await db.graph_meta.find_one({"_id": meta_id("graph", project)})
+    return meta['version'] if meta else 0
+
+async def bump_graph_version(project: str) -> int:
+    """Increment the project's stored graph version and return the new value"""
+    meta = await db.graph_meta.find_one_and_update(
+        {"_id": meta_id("graph", project)},
+        {"$inc": {"version": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return meta['version']
+
+def write_snapshot(path: Path, version: int, node_count: int, edge_count: int, body: bytes):
+    """Atomically write an encoded graph body to a snapshot file"""
+    tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, version, node_count, edge_count, len(body)))
+        f.write(body)
+    os.replace(tmp_path, path)
+
+class GraphCache:
+    """Encoded graph-data body tagged with the graph version it was built from"""
+
+    def __init__(self):
+        self.version = None
+        self.latest_version = 0
+        self.checked_at = 0.0
+        self.node_count = 0
+        self.edge_count = 0
+        self._body = None
+        self._mmap = None
+
+    @property
+    def is_current(self) -> bool:
+        return self._body is not None and self.version == self.latest_version
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._body is not None
+
+    def body(self) -> Union[bytes, memoryview]:
+        """The encoded body; after a snapshot load, a view straight into the mapping"""
+        return self._body
+
+    def store(self, version: int, body: bytes, node_count: int, edge_count: int):
+        if self._body is not None and version < self.version:
+            # A slower, older rebuild finished after a newer one
+            return
+        self._release_mmap()
+        self.version = version
+        self.latest_version = max(self.latest_version, version)
+        self.node_count = node_count
+        self.edge_count = edge_count
+        self._body = body
+
+    def apply_changes(self, changes: List[dict]):
+        """Apply change log entries to the cached graph and re-encode it"""
+        graph = json.loads(bytes(self.body()))
+        nodes = {n['id']: n for n in graph['nodes']}
+        edges = {e['id']: e for e in graph['edges']}
+
+        for change in changes:
+            for patch in change['patches']:
+                if patch['op'] == 'reset':
+                    nodes.clear()
+                    edges.clear()
+                    continue
+                target = nodes if patch['entity'] == 'view' else edges
+                if patch['op'] == 'upsert':
+                    target[patch['key']] = patch['data']
+                else:
+                    target.pop(patch['key'], None)
+
+        body = json.dumps({"nodes": list(nodes.values()), "edges": list(edges.values())}).encode()
+        self.store(changes[-1]['version'], body, len(nodes), len(edges))
+
+    def load_snapshot(self, path: Path) -> bool:
+        """Memory-map a snapshot file, returning whether it could be used"""
+        try:
+            with open(path, 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return False
+
+        if len(mapped) < SNAPSHOT_HEADER.size:
+            mapped.close()
+            return False
+        magic, version, node_count, edge_count, length = SNAPSHOT_HEADER.unpack_from(mapped)
+        if magic != SNAPSHOT_MAGIC or len(mapped) != SNAPSHOT_HEADER.size + length:
+            mapped.close()
+            return False
+
+        self.store(version, None, node_count, edge_count)
+        self._mmap = mapped
+        self._body = memoryview(mapped)[SNAPSHOT_HEADER.size:]
+        return True
+
+    def discard(self, latest_version: int):
+        """Drop the cached body, e.g. a snapshot of a database that has since been replaced"""
+        self._release_mmap()
+        self._body = None
+        self.version = None
+        self.latest_version = latest_version
+        self.node_count = 0
+        self.edge_count = 0
+
+    def _release_mmap(self):
+        # Responses still being sent may hold views into the mapping, so leave
+        # unmapping to garbage collection once the last of them is done
+        self._mmap = None
+
+class GraphResponse(Response):
+    """JSON response whose body may be a memoryview into a snapshot mapping"""
+    media_type = "application/json"
+
+    def render(self, content) -> Union[bytes, memoryview]:
+        if isinstance(content, memoryview):
+            return content
+        return super().render(content)
+
+def snapshot_path(project: str) -> Path:
+    if project == DEFAULT_PROJECT:
+        return GRAPH_SNAPSHOT_PATH
+    return GRAPH_SNAPSHOT_PATH.with_name(f"{GRAPH_SNAPSHOT_PATH.stem}-{project}{GRAPH_SNAPSHOT_PATH.suffix}")
+
+graph_caches = {}
+
+def get_graph_cache(project: str) -> GraphCache:
+    """Get a project's graph cache, loading its snapshot on first use"""
+    if project not in graph_caches:
+        cache = GraphCache()
+        if cache.load_snapshot(snapshot_path(project)):
+            # Let change feed clients resume across restarts of the same graph version
+            get_change_feed(project).seq = cache.version
+        graph_caches[project] = cache
+    return graph_caches[project]
+
+startup_metrics = {"source": None, "ready_ms": None, "reconciled_ms": None, "first_graph_read_ms": None}
+background_tasks = set()
+
+def run_in_background(coro):
+    """Start a task and keep a reference to it until it finishes"""
+    task = asyncio.ensure_future(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+async def persist_graph_snapshot(project: str):
+    """Write a project's graph cache to disk without blocking the event loop"""
+    cache = get_graph_cache(project)
+    if not cache.is_current:
+        return
+    try:
+        await asyncio.to_thread(
+            write_snapshot, snapshot_path(project), cache.version,
+            cache.node_count, cache.edge_count, cache.body()
+        )
+    except OSError as e:
+        logger.warning(f"Could not write graph snapshot: {e}")
+
+def history_doc(doc: dict) -> dict:
+    """Strip fields that are not part of an entity's recorded state"""
+    return {k: v for k, v in doc.items() if k not in ('_id', 'degree')}
+
+def history_change(entity: str, key, before: Optional[dict], after: Optional[dict]) -> dict:
+    """Describe one entity going from before to after (None meaning absent)"""
+    return {
+        "entity": entity,
+        "key": key,
+        "before": history_doc(before) if before else None,
+        "after": history_doc(after) if after else None
+    }
+
+def change_patch(change: dict) -> dict:
+    if change['after'] is None:
+        return delete_patch(change['entity'], change['key'])
+    if change['entity'] == 'view':
+        return view_patch(change['after'])
+    return relation_patch(change['after'])
+
+def entry_patches(entry: dict) -> Optional[List[dict]]:
+    """Derive a log entry's feed patches; None if applying it needs a full rebuild"""
+    if entry.get('reset'):
+        return [{"op": "reset"}]
+    if entry.get('changes') is None:
+        return None
+    return [change_patch(c) for c in entry['changes']]
+
+async def record_write(
+    project: str,
+    changes: Optional[List[dict]],
+    stats_delta: Optional[Counter] = None,
+    degree_changes: Optional[Counter] = None,
+    kind: str = "write",
+    target: Optional[int] = None,
+    reset: bool = False
+) -> Optional[int]:
+    """Update maintained stats, bump the graph version, log the write and broadcast its patches.
+    
+    Callers hold graph_write_lock(project) across their data write and this call.
+    changes=None records a write that cannot be replayed entry by entry; a checkpoint
+    is taken at its version instead so history can still be rebuilt across it.
+    """
+    if changes is not None and not changes and not reset:
+        return None
+    await apply_stats_delta(project, stats_delta or Counter(), degree_changes or Counter())
+    version = await bump_graph_version(project)
+    
+    try:
+        if changes is not None and len(changes) > GRAPH_CHANGE_LOG_MAX_PATCHES:
+            # Oversized bulk writes are logged opaquely and force a full cache rebuild
+            changes = None
+        patches = entry_patches({"reset": reset, "changes": changes})
+        
+        created_at = datetime.now(timezone.utc)
+        await db.graph_changes.insert_one({
+            "project": project,
+            "version": version,
+            "kind": kind,
+            "target": target,
+            "reset": reset,
+            "changes": changes,
+            "created_at": created_at
+        })
+        await push_history(project, version, kind)
+        cache = get_graph_cache(project)
+        cache.latest_version = max(cache.latest_version, version)
+        
+        if patches is None:
+            await write_checkpoint(project, version, created_at, from_mongo=True)
+        elif version % GRAPH_CHECKPOINT_EVERY == 0:
+            run_in_background(write_checkpoint(project, version, created_at))
+    except BaseException:
+        if not GRAPH_MULTI_WORKER:
+            # The feed holds later versions until this one arrives, so never leave it missing
+            get_change_feed(project).publish(version, [{"op": "resync"}])
+        raise
+    
+    if GRAPH_MULTI_WORKER:
+        # Broadcast from the ordered change log so every worker streams the same sequence
+        run_in_background(poll_graph_version(project))
+    else:
+        get_change_feed(project).publish(version, patches or [{"op": "resync"}])
+    return version
+
+# ============ MULTI-WORKER COORDINATION ============
+
+# Per-project locks serialising this worker's writes
+write_locks = {}
+
+@asynccontextmanager
+async def graph_write_lock(project: str):
+    """Serialise a project's writes so its log versions follow the order Mongo applied them.
+    
+    Hold it from before the data write until record_write returns. Across workers
+    a lease in graph_meta does the same, renewed while held.
+    """
+    async with write_locks.setdefault(project, asyncio.Lock()):
+        if not GRAPH_MULTI_WORKER:
+            async with stats_write(project):
+                yield
+            return
+        token = await acquire_write_lease(project)
+        renewal = run_in_background(renew_write_lease(project, token))
+        try:
+            async with stats_write(project):
+                yield
+        finally:
+            renewal.cancel()
+            await db.graph_meta.update_one(
+                {"_id": meta_id("lock", project), "owner": token},
+                {"$set": {"owner": None}}
+            )
+
+async def acquire_write_lease(project: str) -> str:
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + GRAPH_WRITE_LOCK_WAIT_S
+    while True:
+        now = datetime.now(timezone.utc)
+        try:
+            # Upserting a held lease collides on _id, so only a free or expired one is taken
+            await db.graph_meta.update_one(
+                {"_id": meta_id("lock", project), "$or": [{"owner": None}, {"expires_at": {"$lte": now}}]},
+                {"$set": {"owner": token, "expires_at": now + timedelta(seconds=GRAPH_WRITE_LOCK_TTL_S)}},
+                upsert=True
+            )
+            return token
+        except DuplicateKeyError:
+            pass
+        if time.monotonic() > deadline:
+            raise HTTPException(
+                status_code=503,
+                detail="Another write to this project is taking too long",
+                headers={"Retry-After": "1"}
+            )
+        await asyncio.sleep(0.02)
+
+async def renew_write_lease(project: str, token: str):
+    while True:
+        await asyncio.sleep(GRAPH_WRITE_LOCK_TTL_S / 3)
+        await db.graph_meta.update_one(
+            {"_id": meta_id("lock", project), "owner": token},
+            {"$set": {"expires_at": datetime.now(timezone.utc) + timedelta(seconds=GRAPH_WRITE_LOCK_TTL_S)}}
+        )
+
+async def sync_graph_version(project: str, force: bool = False):
+    """Learn about writes from other workers, checking Mongo at most once per lag window"""
+    cache = get_graph_cache(project)
+    now = time.monotonic()
+    if not force and now - cache.checked_at < GRAPH_VERSION_MAX_LAG_MS / 1000:
+        return
+    version = await read_graph_version(project)
+    if not cache.checked_at and cache.is_loaded and version < cache.version:
+        # Versions only go down when the database was restored or recreated, so the
+        # snapshot describes a graph Mongo no longer has
+        logger.warning(f"Graph snapshot v{cache.version} of project {project} is ahead of Mongo v{version}, rebuilding")
+        cache.discard(version)
+        get_change_feed(project).rewind(version)
+    cache.checked_at = now
+    cache.latest_version = max(cache.latest_version, version)
+
+async def refresh_graph_cache(project: str):
+    """Bring a project's graph cache up to the latest known version"""
+    cache = get_graph_cache(project)
+    await read_flight.do(("graph-data", project, cache.latest_version), lambda: _refresh_graph_cache(project))
+
+async def _refresh_graph_cache(project: str):
+    cache = get_graph_cache(project)
+    feed = get_change_feed(project)
+    if cache.is_loaded:
+        target = cache.latest_version
+        async with read_limiter.slot():
+            changes = await db.graph_changes.find(
+                {"project": project, "version": {"$gt": cache.version, "$lte": target}},
+                {"_id": 0, "version": 1, "reset": 1, "changes": 1}
+            ).sort("version", 1).to_list(None)
+        for change in changes:
+            change['patches'] = entry_patches(change)
+        
+        # Only replay an unbroken run of versions; gaps or oversized entries need a rebuild
+        versions = [c['version'] for c in changes]
+        if versions and versions == list(range(cache.version + 1, target + 1)) \
+                and all(c['patches'] is not None for c in changes):
+            cache.apply_changes(changes)
+            for change in changes:
+                if change['version'] > feed.seq:
+                    feed.publish(change['version'], change['patches'])
+            run_in_background(persist_graph_snapshot(project))
+            return
+    
+    await build_graph_data(project)
+    if cache.version > feed.seq:
+        feed.publish(cache.version, [{"op": "resync"}])
+
+async def poll_graph_version(project: str):
+    """Refresh a project's cache in the background so idle workers still stream changes"""
+    try:
+        await sync_graph_version(project, force=True)
+        if not get_graph_cache(project).is_current:
+            await refresh_graph_cache(project)
+    except Exception as e:
+        logger.warning(f"Graph version refresh failed for project {project}: {e}")
+
+async def poll_loaded_projects():
+    # Only projects this worker has served need following; others load fresh on first use
+    for project in list(graph_caches):
+        await poll_graph_version(project)
+
+async def watch_graph_version():
+    """Follow the shared graph versions, preferring a change stream over polling"""
+    try:
+        pipeline = [{"$match": {"documentKey._id": {"$regex": "^graph(:|$)"}}}]
+        async with db.graph_meta.watch(pipeline) as stream:
+            logger.info("Following graph versions through a change stream")
+            async for event in stream:
+                project = meta_project(event['documentKey']['_id'])
+                if project in graph_caches:
+                    await poll_graph_version(project)
+    except OperationFailure:
+        logger.info("Change streams unavailable, polling graph versions")
+    except PyMongoError as e:
+        logger.warning(f"Graph version change stream failed, polling instead: {e}")
+    
+    while True:
+        await asyncio.sleep(GRAPH_VERSION_MAX_LAG_MS / 1000)
+        await poll_loaded_projects()
+
+# ============ MAINTAINED STATISTICS ============
+
+STATS_RECONCILE_INTERVAL_S = int(os.environ.get('STATS_RECONCILE_INTERVAL_S', '3600'))
+STATS_SECTIONS = ("degree_histogram", "join_types", "view_version_spreads", "relation_version_spreads")
+
+def is_placeholder_view(view: dict) -> bool:
+    """Views auto-created by the SQL import for relations pointing at unknown IDs"""
+    return view.get('name') == f"View_{view['view_id']}" and not view.get('name2') and not view.get('alias')
+
+def version_spread_bucket(min_version: Optional[int], max_version: Optional[int]) -> str:
+    """Bucket max - min by order of magnitude, e.g. '1000' holds spreads 1000-9999"""
+    if min_version is None or max_version is None:
+        return "unset"
+    spread = max_version - min_version
+    if spread < 0:
+        return "inverted"
+    return "0" if spread == 0 else str(10 ** (len(str(spread)) - 1))
+
+def view_stats_delta(view: dict, sign: int = 1) -> Counter:
+    return Counter({
+        "views_count": sign,
+        "placeholder_views": sign if is_placeholder_view(view) else 0,
+        f"degree_histogram.{view.get('degree', 0)}": sign,
+        f"view_version_spreads.{version_spread_bucket(view.get('min_app_version'), view.get('max_app_version'))}": sign
+    })
+
+def relation_stats_delta(relation: dict, sign: int = 1) -> Counter:
+    return Counter({
+        "relations_count": sign,
+        f"join_types.{relation.get('join_type') or 'DEFAULT'}": sign,
+        f"relation_version_spreads.{version_spread_bucket(relation.get('min_app_version'), relation.get('max_app_version'))}": sign
+    })
+
+def relation_degree_changes(relation: dict, sign: int = 1, exclude: Optional[int] = None) -> Counter:
+    """Degree change of each endpoint; a self-relation counts twice"""
+    changes = Counter()
+    for vid in (relation['id_view1'], relation['id_view2']):
+        if vid != exclude:
+            changes[vid] += sign
+    return changes
+
+async def apply_stats_delta(project: str, stats_delta: Counter, degree_changes: Counter):
+    """Move per-view degrees and $inc the stats document in one update"""
+    delta = Counter(stats_delta)
+    for vid, change in degree_changes.items():
+        if not change:
+            continue
+        before = await db.views.find_one_and_update(
+            {"project": project, "view_id": vid},
+            {"$inc": {"degree": change}},
+            projection={"_id": 0, "degree": 1},
+            return_document=ReturnDocument.BEFORE
+        )
+        if before is None:
+            continue
+        degree = before.get('degree', 0)
+        delta[f"degree_histogram.{degree}"] -= 1
+        delta[f"degree_histogram.{degree + change}"] += 1
+    
+    inc = {k: v for k, v in delta.items() if v}
+    if inc:
+        # Until the first reconciliation fills the document, partial counts would be wrong.
+        # The revision lets reconcile_stats notice increments that land while it scans.
+        await db.graph_meta.update_one(
+            {"_id": meta_id("stats", project), "reconciled_at": {"$exists": True}},
+            {"$inc": {**inc, "revision": 1}}
+        )
+
+@asynccontextmanager
+async def stats_write(project: str):
+    """Mark a write in progress on the stats document for its whole duration.
+    
+    The mark lands before any data is touched, so a reconciliation either sees it
+    and waits, or has its swap rejected by the revision it bumped.
+    """
+    await db.graph_meta.update_one(
+        {"_id": meta_id("stats", project)},
+        {"$inc": {"revision": 1, "writing": 1}, "$set": {"writing_at": datetime.now(timezone.utc)}},
+        upsert=True
+    )
+    try:
+        yield
+    finally:
+        await db.graph_meta.update_one({"_id": meta_id("stats", project)}, {"$inc": {"writing": -1}})
+
+def empty_stats() -> dict:
+    return {"views_count": 0, "relations_count": 0, "placeholder_views": 0, **{k: {} for k in STATS_SECTIONS}}
+
+async def reset_stats(project: str):
+    await db.graph_meta.update_one(
+        {"_id": meta_id("stats", project)},
+        {"$set": {**empty_stats(), "reconciled_at": datetime.now(timezone.utc).isoformat()}, "$inc": {"revision": 1}},
+        upsert=True
+    )
+
+def compute_stats(views, relations) -> tuple:
+    """Stats and view degrees of a graph, computed from scratch"""
+    degrees = Counter()
+    totals = Counter()
+    for relation in relations:
+        degrees.update(relation_degree_changes(relation))
+        totals.update(relation_stats_delta(relation))
+    for view in views:
+        totals.update(view_stats_delta({**view, "degree": degrees.get(view['view_id'], 0)}))
+    
+    stats = empty_stats()
+    for key, value in totals.items():
+        if '.' in key:
+            section, bucket = key.split('.', 1)
+            stats[section][bucket] = value
+        else:
+            stats[key] = value
+    return stats, degrees
+
+STATS_RECONCILE_ATTEMPTS = 5
+# A write mark older than this is taken to be left by a crashed worker
+STATS_WRITE_STALE_S = int(os.environ.get('STATS_WRITE_STALE_S', '600'))
+
+async def reconcile_stats(project: str, holding_lock: bool = False):
+    """Recompute a project's stats and view degrees from scratch to correct any drift.
+    
+    Callers inside graph_write_lock pass holding_lock so their own write mark is expected.
+    """
+    for attempt in range(STATS_RECONCILE_ATTEMPTS):
+        if await try_reconcile_stats(project, 1 if holding_lock else 0):
+            return
+        await asyncio.sleep(0.1 * (attempt + 1))
+    logger.warning(f"Stats for project {project} kept changing during reconciliation, left as maintained")
+
+async def try_reconcile_stats(project: str, own_writes: int = 0) -> bool:
+    """One reconciliation pass, swapped in only if no write touched the stats meanwhile"""
+    stats_id = meta_id("stats", project)
+    current = await db.graph_meta.find_one({"_id": stats_id}, {"_id": 0, "revision": 1, "writing": 1, "writing_at": 1})
+    revision = current.get('revision') if current else None
+    writing = current.get('writing', 0) if current else 0
+    if writing > own_writes:
+        writing_at = current.get('writing_at')
+        if writing_at and writing_at.replace(tzinfo=timezone.utc) > datetime.now(timezone.utc) - timedelta(seconds=STATS_WRITE_STALE_S):
+            # A write may be between its data change and its $inc; scanning now could count it twice
+            return False
+        logger.warning(f"Clearing an abandoned stats write mark on project {project}")
+        writing = own_writes
+    
+    relations = await db.view_relations.find(
+        {"project": project}, {"_id": 0, "id_view1": 1, "id_view2": 1, "join_type": 1, "min_app_version": 1, "max_app_version": 1}
+    ).to_list(None)
+    views = await db.views.find(
+        {"project": project}, {"_id": 0, "view_id": 1, "name": 1, "name2": 1, "alias": 1,
+             "min_app_version": 1, "max_app_version": 1, "degree": 1}
+    ).to_list(None)
+    
+    stats, degrees = compute_stats(views, relations)
+    stats["reconciled_at"] = datetime.now(timezone.utc).isoformat()
+    stats["revision"] = (revision or 0) + 1
+    stats["writing"] = writing
+    if current and current.get('writing_at'):
+        stats["writing_at"] = current['writing_at']
+    
+    if current is None:
+        try:
+            await db.graph_meta.insert_one({"_id": stats_id, **stats})
+        except DuplicateKeyError:
+            return False
+    else:
+        # A missing revision field matches None, which covers documents from before revisions existed
+        result = await db.graph_meta.replace_one({"_id": stats_id, "revision": revision}, stats)
+        if result.matched_count != 1:
+            return False
+    
+    # Only after the swap: from here on any write started after the scan, so its data is
+    # not in it, and only the degree this scan saw is overwritten if its $inc came first
+    for view in views:
+        degree = degrees.get(view['view_id'], 0)
+        if view.get('degree', 0) != degree:
+            await db.views.update_one(
+                {"project": project, "view_id": view['view_id'], "degree": view.get('degree')},
+                {"$set": {"degree": degree}}
+            )
+    return True
+
+async def reconcile_stats_periodically():
+    first_pass = True
+    while True:
+        for project in await materialized_projects():
+            try:
+                if not first_pass or not await db.graph_meta.find_one(
+                    {"_id": meta_id("stats", project), "reconciled_at": {"$exists": True}}, {"_id": 1}
+                ):
+                    await reconcile_stats(project)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Stats reconciliation failed for project {project}: {e}")
+        first_pass = False
+        await asyncio.sleep(STATS_RECONCILE_INTERVAL_S)
+
+# ============ CHANGE HISTORY ============
+
+async def push_history(project: str, version: int, kind: str):
+    """Track undoable versions; a new write invalidates anything that could be redone"""
+    if kind == "write":
+        update = {"$push": {"undo": {"$each": [version], "$slice": -GRAPH_UNDO_DEPTH}}, "$set": {"redo": []}}
+    elif kind == "redo":
+        update = {"$push": {"undo": {"$each": [version], "$slice": -GRAPH_UNDO_DEPTH}}}
+    else:
+        return
+    await db.graph_meta.update_one({"_id": meta_id("history", project)}, update, upsert=True)
+
+async def pop_history(project: str, stack: str) -> Optional[dict]:
+    """Pop the newest version off the undo or redo stack and return its log entry.
+    
+    The entry is checked before popping, so one that can no longer be applied stays
+    on the stack instead of being skipped in favour of an older change.
+    """
+    history_id = meta_id("history", project)
+    doc = await db.graph_meta.find_one({"_id": history_id}, {stack: 1})
+    versions = (doc or {}).get(stack) or []
+    if not versions:
+        return None
+    
+    entry = await load_history_entry(project, versions[-1])
+    popped = await db.graph_meta.update_one(
+        {"_id": history_id, stack: {"$size": len(versions)}, f"{stack}.{len(versions) - 1}": versions[-1]},
+        {"$pop": {stack: 1}}
+    )
+    if not popped.modified_count:
+        raise HTTPException(status_code=409, detail="History changed concurrently, try again")
+    return entry
+
+async def push_history_stack(project: str, stack: str, version: int):
+    """Put a version on top of the undo or redo stack"""
+    await db.graph_meta.update_one(
+        {"_id": meta_id("history", project)},
+        {"$push": {stack: {"$each": [version], "$slice": -GRAPH_UNDO_DEPTH}}},
+        upsert=True
+    )
+
+async def graph_state_at(project: str, version: Optional[int] = None, at: Optional[datetime] = None):
+    """Rebuild a project's graph at a version or time from the nearest checkpoint plus a replay"""
+    checkpoint_query = {"project": project}
+    if version is not None:
+        checkpoint_query["version"] = {"$lte": version}
+    if at is not None:
+        checkpoint_query["created_at"] = {"$lte": at}
+    base = await db.graph_checkpoints.find_one(checkpoint_query, {"_id": 0}, sort=[("version", -1)])
+    
+    base_version = base['version'] if base else 0
+    views = {v['view_id']: v for v in base['views']} if base else {}
+    relations = {r['id']: r for r in base['relations']} if base else {}
+    
+    log_query = {"project": project, "version": {"$gt": base_version}}
+    if version is not None:
+        log_query["version"]["$lte"] = version
+    if at is not None:
+        log_query["created_at"] = {"$lte": at}
+    entries = await db.graph_changes.find(
+        log_query, {"_id": 0, "version": 1, "reset": 1, "changes": 1}
+    ).sort("version", 1).to_list(None)
+    
+    current = base_version
+    for entry in entries:
+        if entry['version'] != current + 1:
+            raise HTTPException(status_code=409, detail=f"History before version {entry['version']} is no longer available")
+        current = entry['version']
+        if entry.get('reset'):
+            views.clear()
+            relations.clear()
+            continue
+        if entry.get('changes') is None:
+            raise HTTPException(status_code=409, detail=f"Version {current} cannot be replayed")
+        for change in entry['changes']:
+            target = views if change['entity'] == 'view' else relations
+            if change['after'] is None:
+                target.pop(change['key'], None)
+            else:
+                target[change['key']] = change['after']
+    
+    return current, views, relations
+
+async def write_checkpoint(
+    project: str,
+    version: Optional[int] = None,
+    created_at: Optional[datetime] = None,
+    from_mongo: bool = False
+):
+    """Store a project's full graph at a version, compacted from the log when possible"""
+    try:
+        if not from_mongo:
+            try:
+                version, views, relations = await graph_state_at(project, version=version)
+                views, relations = list(views.values()), list(relations.values())
+            except HTTPException:
+                from_mongo = True
+        if from_mongo:
+            if version is None:
+                version = await read_graph_version(project)
+            views = [history_doc(v) for v in await db.views.find({"project": project}, {"_id": 0}).to_list(None)]
+            relations = [history_doc(r) for r in await db.view_relations.find({"project": project}, {"_id": 0}).to_list(None)]
+        
+        await db.graph_checkpoints.replace_one(
+            {"project": project, "version": version},
+            {
+                "project": project,
+                "version": version,
+                "created_at": created_at or datetime.now(timezone.utc),
+                "views": views,
+                "relations": relations
+            },
+            upsert=True
+        )
+    except PyMongoError as e:
+        logger.warning(f"Could not write graph checkpoint for project {project}: {e}")
+
+async def compact_history(project: str):
+    """Checkpoint if a project's log has grown and drop history older than the retention window"""
+    scope = {"project": project}
+    latest = await db.graph_changes.find_one(scope, {"_id": 0, "version": 1}, sort=[("version", -1)])
+    newest = await db.graph_checkpoints.find_one(scope, {"_id": 0, "version": 1}, sort=[("version", -1)])
+    if latest and latest['version'] - (newest['version'] if newest else 0) >= GRAPH_CHECKPOINT_EVERY:
+        await write_checkpoint(project, latest['version'])
+    
+    # Keep the newest checkpoint older than the cutoff as the replay base for the window
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=GRAPH_HISTORY_RETENTION_S)
+    base_query = {**scope, "created_at": {"$lte": cutoff}}
+    # Pending clones are rebuilt from this history, so keep it back to the oldest clone point
+    oldest_clone = await db.projects.find_one(
+        {"clone_of": project, "materialized": False}, {"_id": 0, "clone_version": 1}, sort=[("clone_version", 1)]
+    )
+    if oldest_clone:
+        base_query["version"] = {"$lte": oldest_clone['clone_version']}
+    base = await db.graph_checkpoints.find_one(base_query, {"_id": 0, "version": 1}, sort=[("version", -1)])
+    if base:
+        await db.graph_checkpoints.delete_many({**scope, "version": {"$lt": base['version']}})
+        await db.graph_changes.delete_many({**scope, "version": {"$lte": base['version']}})
+
+async def compact_history_periodically():
+    while True:
+        for project in await materialized_projects():
+            try:
+                if not await db.graph_checkpoints.find_one({"project": project}, {"_id": 1}):
+                    # Give the log a replay base from the current data
+                    await write_checkpoint(project, from_mongo=True)
+                await compact_history(project)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"History compaction failed for project {project}: {e}")
+        await asyncio.sleep(GRAPH_COMPACTION_INTERVAL_S)
+
+async def clear_graph(project: str, kind: str = "write", target: Optional[int] = None) -> int:
+    """Delete a project's views and relations, checkpointing first so the reset can be undone"""
+    await write_checkpoint(project, from_mongo=True)
+    await db.views.delete_many({"project": project})
+    await db.view_relations.delete_many({"project": project})
+    await reset_stats(project)
+    return await record_write(project, [], kind=kind, target=target, reset=True)
+
+async def restore_states(project: str, entry: dict, side: str, kind: str) -> int:
+    """Put every entity touched by a log entry back to its before or after state"""
+    changes = entry['changes'] if side == 'after' else list(reversed(entry['changes']))
+    new_changes = []
+    stats_delta = Counter()
+    degree_changes = Counter()
+    
+    for change in changes:
+        entity, key, state = change['entity'], change['key'], change[side]
+        if entity == 'view':
+            collection, match = db.views, {"project": project, "view_id": key}
+        else:
+            collection, match = db.view_relations, {"project": project, "id": key}
+        current = await collection.find_one(match, {"_id": 0})
+        
+        if state is None:
+            if current:
+                await collection.delete_one(match)
+        elif entity == 'view':
+            # $set keeps the maintained degree, which recorded states do not carry
+            await collection.update_one(match, {"$set": state}, upsert=True)
+        else:
+            await collection.replace_one(match, state, upsert=True)
+        
+        if entity == 'view':
+            degree = current.get('degree', 0) if current else 0
+            if current:
+                stats_delta.update(view_stats_delta(current, -1))
+            if state:
+                stats_delta.update(view_stats_delta({**state, "degree": degree}))
+        else:
+            if current:
+                stats_delta.update(relation_stats_delta(current, -1))
+                degree_changes.update(relation_degree_changes(current, -1))
+            if state:
+                stats_delta.update(relation_stats_delta(state))
+                degree_changes.update(relation_degree_changes(state))
+        new_changes.append(history_change(entity, key, current, state))
+    
+    return await record_write(project, new_changes, stats_delta, degree_changes, kind=kind, target=entry['version'])
+
+async def restore_graph_before(project: str, entry: dict) -> int:
+    """Undo a reset by reloading the graph as it was just before it"""
+    _, views, relations = await graph_state_at(project, version=entry['version'] - 1)
+    await db.views.delete_many({"project": project})
+    await db.view_relations.delete_many({"project": project})
+    await load_graph_state(project, views.values(), relations.values())
+    await reconcile_stats(project, holding_lock=True)
+    return await record_write(project, None, kind="undo", target=entry['version'])
+
+async def load_history_entry(project: str, version: int) -> dict:
+    entry = await db.graph_changes.find_one({"project": project, "version": version}, {"_id": 0, "patches": 0})
+    if entry is None or (entry.get('changes') is None and not entry.get('reset')):
+        raise HTTPException(status_code=409, detail="This change can no longer be undone or redone")
+    return entry
+
+# ============ PROJECT REGISTRY ============
+
+PROJECT_MATERIALIZE_TIMEOUT_S = int(os.environ.get('PROJECT_MATERIALIZE_TIMEOUT_S', '300'))
+# Projects confirmed to exist, by key, with when they were last checked
+known_projects = {}
+
+async def materialized_projects() -> List[str]:
+    docs = await db.projects.find({"materialized": True}, {"_id": 0, "key": 1}).to_list(None)
+    return [d['key'] for d in docs] or [DEFAULT_PROJECT]
+
+async def load_graph_state(project: str, views, relations):
+    """Insert recorded view and relation states into a project"""
+    views = [{**history_doc(v), "project": project} for v in views]
+    relations = [{**history_doc(r), "project": project} for r in relations]
+    if views:
+        await db.views.insert_many(views)
+    if relations:
+        await db.view_relations.insert_many(relations)
+
+async def materialize_project(doc: dict):
+    """Copy a cloned project's source graph as of the clone, before its first write"""
+    key = doc['key']
+    token = uuid.uuid4().hex
+    stale = datetime.now(timezone.utc) - timedelta(seconds=PROJECT_MATERIALIZE_TIMEOUT_S)
+    claimed = await db.projects.find_one_and_update(
+        {"key": key, "materialized": False, "$or": [
+            {"materializing_at": None}, {"materializing_at": {"$lte": stale}}
+        ]},
+        {"$set": {"materializing": token, "materializing_at": datetime.now(timezone.utc)}}
+    )
+    if claimed is None:
+        # Another request is copying it; wait for that copy instead of starting a second one
+        deadline = time.monotonic() + PROJECT_MATERIALIZE_TIMEOUT_S
+        while time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+            current = await db.projects.find_one({"key": key}, {"_id": 0})
+            if current is None:
+                raise HTTPException(status_code=404, detail="Project not found")
+            if current.get('materialized'):
+                return
+            if current.get('materializing_at') is None:
+                # The other copy failed and released its claim
+                return await materialize_project(current)
+        raise HTTPException(
+            status_code=503,
+            detail="Project is still being copied from its source",
+            headers={"Retry-After": "5"}
+        )
+    
+    source, version = doc['clone_of'], doc['clone_version']
+    try:
+        # A crashed earlier attempt may have left a partial copy
+        await db.views.delete_many({"project": key})
+        await db.view_relations.delete_many({"project": key})
+        views, relations = await pending_clone_state(doc)
+        await load_graph_state(key, views, relations)
+        await reconcile_stats(key)
+        await write_checkpoint(key, 0, doc['created_at'], from_mongo=True)
+    except BaseException:
+        # Let the next write (or a waiter) retry right away instead of after the timeout
+        await db.projects.update_one(
+            {"key": key, "materializing": token},
+            {"$unset": {"materializing": "", "materializing_at": ""}}
+        )
+        raise
+    
+    await db.projects.update_one(
+        {"key": key, "materializing": token},
+        {"$set": {"materialized": True}, "$unset": {"materializing": "", "materializing_at": ""}}
+    )
+    logger.info(f"Materialized project {key} from {source} v{version}")
+
+async def pending_clone_state(doc: dict) -> tuple:
+    """Views and relations of an untouched clone: its source as of the clone version"""
+    source, version = doc['clone_of'], doc['clone_version']
+    if await read_graph_version(source) == version:
+        views = await db.views.find({"project": source}, {"_id": 0}).to_list(None)
+        relations = await db.view_relations.find({"project": source}, {"_id": 0}).to_list(None)
+        if await read_graph_version(source) == version:
+            return views, relations
+    _, views, relations = await graph_state_at(source, version=version)
+    return list(views.values()), list(relations.values())
+
+def matches_query(doc: dict, query: dict) -> bool:
+    """Evaluate the Mongo filters the read endpoints build against an in-memory document"""
+    for field, condition in query.items():
+        if field == '$or':
+            if not any(matches_query(doc, q) for q in condition):
+                return False
+            continue
+        value = doc.get(field)
+        if isinstance(condition, dict):
+            if '$regex' in condition:
+                flags = re.IGNORECASE if 'i' in condition.get('$options', '') else 0
+                if not isinstance(value, str) or not re.search(condition['$regex'], value, flags):
+                    return False
+            if '$in' in condition and value not in condition['$in']:
+                return False
+        elif isinstance(value, list):
+            # Like Mongo, a scalar matches any element of an array field
+            if condition not in value:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+async def find_in_project(project: dict, entity: str, query: dict, limit: Optional[int] = 10000) -> List[dict]:
+    """Find a project's views or relations; untouched clones are read from their source"""
+    if project.get('materialized'):
+        collection = db.views if entity == 'view' else db.view_relations
+        return await collection.find({"project": project['key'], **query}, {"_id": 0}).to_list(limit)
+    
+    views, relations = await pending_clone_state(project)
+    found = [d for d in (views if entity == 'view' else relations) if matches_query(d, query)]
+    return found[:limit] if limit else found
+
+async def resolve_project(project: str, materialize: bool = False) -> dict:
+    """Look up a project; writers pass materialize=True to copy an untouched clone's data first"""
+    if project == DEFAULT_PROJECT:
+        return {"key": project, "materialized": True}
+    checked_at = known_projects.get(project)
+    if checked_at is not None and time.monotonic() - checked_at < GRAPH_VERSION_MAX_LAG_MS / 1000:
+        return {"key": project, "materialized": True}
+    
+    doc = await db.projects.find_one({"key": project}, {"_id": 0})
+    if doc is None:
+        known_projects.pop(project, None)
+        raise HTTPException(status_code=404, detail="Project not found")
+    if not doc.get('materialized') and materialize:
+        await materialize_project(doc)
+        doc['materialized'] = True
+    if doc.get('materialized'):
+        known_projects[project] = time.monotonic()
+    return doc
+
+# ============ PROJECT ENDPOINTS ============
+
+@api_router.get("/projects", response_model=List[Project])
+async def get_projects():
+    """List graph projects"""
+    return await db.projects.find({}, {"_id": 0}).sort("key", 1).to_list(None)
+
+@api_router.post("/projects", response_model=Project)
+async def create_project(project_data: ProjectCreate):
+    """Create an empty graph project"""
+    if not PROJECT_KEY_PATTERN.match(project_data.key):
+        raise HTTPException(status_code=400, detail="Project key must be lowercase letters, digits, '-' or '_'")
+    
+    project = Project(key=project_data.key, name=project_data.name or project_data.key)
+    try:
+        await db.projects.insert_one(project.model_dump())
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Project with this key already exists")
+    return project
+
+@api_router.post("/projects/{key}/clone", response_model=Project)
+async def clone_project(key: str, project_data: ProjectCreate):
+    """Clone a project without copying any data until its first write"""
+    source = await resolve_project(key)
+    if not PROJECT_KEY_PATTERN.match(project_data.key):
+        raise HTTPException(status_code=400, detail="Project key must be lowercase letters, digits, '-' or '_'")
+    
+    if source.get('materialized'):
+        # No write can land between reading the version and the stats that match it
+        async with graph_write_lock(key):
+            clone_version = await read_graph_version(key)
+            stats = await db.graph_meta.find_one({"_id": meta_id("stats", key)}, {"_id": 0})
+        clone_of = key
+    else:
+        # Cloning a pending clone shares its source rather than forcing a copy
+        clone_of, clone_version = source['clone_of'], source['clone_version']
+        stats = await db.graph_meta.find_one({"_id": meta_id("stats", key)}, {"_id": 0})
+    
+    project = Project(
+        key=project_data.key,
+        name=project_data.name or project_data.key,
+        clone_of=clone_of,
+        clone_version=clone_version,
+        materialized=False
+    )
+    try:
+        await db.projects.insert_one(project.model_dump())
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Project with this key already exists")
+    
+    if stats and 'reconciled_at' in stats:
+        # The clone's graph is fixed until its first write, so so are these stats
+        for field in ('revision', 'writing', 'writing_at'):
+            stats.pop(field, None)
+        await db.graph_meta.replace_one({"_id": meta_id("stats", project.key)}, stats, upsert=True)
+    return project
+
+@api_router.delete("/projects/{key}")
+async def delete_project(key: str):
+    """Delete a project with its graph, history and snapshot"""
+    if key == DEFAULT_PROJECT:
+        raise HTTPException(status_code=400, detail="The default project cannot be deleted")
+    await resolve_project(key)
+    if await db.projects.find_one({"clone_of": key, "materialized": False}, {"_id": 1}):
+        raise HTTPException(status_code=409, detail="Pending clones still read from this project")
+    
+    await db.projects.delete_one({"key": key})
+    for collection in (db.views, db.view_relations, db.graph_changes, db.graph_checkpoints):
+        await collection.delete_many({"project": key})
+    await db.graph_meta.delete_many({"_id": {"$in": [meta_id(k, key) for k in ("graph", "stats", "history", "lock")]}})
+    
+    known_projects.pop(key, None)
+    write_locks.pop(key, None)
+    graph_caches.pop(key, None)
+    change_feeds.pop(key, None)
+    snapshot_path(key).unlink(missing_ok=True)
+    return {"message": "Project deleted"}
 
 # ============ VIEW ENDPOINTS ============
 
 @api_router.get("/views", response_model=List[View])
 async def get_views(
     search: Optional[str] = None,
-    view_id: Optional[int] = None
+    view_id: Optional[int] = None,
+    project: str = DEFAULT_PROJECT
 ):
     """Get all views with optional filtering"""
+    doc = await resolve_project(project)
     query = {}
     
     if search:
@@ -238,7 +1705,8 @@ async def get_views(
     if view_id is not None:
         query["view_id"] = view_id
     
-    views = await db.views.find(query, {"_id": 0}).to_list(10000)
+    async with read_limiter.slot():
+        views = await find_in_project(doc, "view", query)
     
     for view in views:
         if isinstance(view.get('created_at'), str):
@@ -247,9 +1715,11 @@ async def get_views(
     return views
 
 @api_router.get("/views/{view_id}", response_model=View)
-async def get_view(view_id: int):
+async def get_view(view_id: int, project: str = DEFAULT_PROJECT):
     """Get a single view by view_id"""
-    view = await db.views.find_one({"view_id": view_id}, {"_id": 0})
+    doc = await resolve_project(project)
+    found = await find_in_project(doc, "view", {"view_id": view_id}, limit=1)
+    view = found[0] if found else None
     if not view:
         raise HTTPException(status_code=404, detail="View not found")
     
@@ -259,66 +1729,101 @@ async def get_view(view_id: int):
     return view
 
 @api_router.post("/views", response_model=View)
-async def create_view(view_data: ViewCreate):
+async def create_view(view_data: ViewCreate, project: str = DEFAULT_PROJECT):
     """Create a new view"""
-    # Check if view_id already exists
-    existing = await db.views.find_one({"view_id": view_data.view_id})
-    if existing:
-        raise HTTPException(status_code=400, detail="View with this ID already exists")
-    
-    view = View(**view_data.model_dump())
-    doc = view.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    
-    await db.views.insert_one(doc)
-    return view
+    await resolve_project(project, materialize=True)
+    async with graph_write_lock(project):
+        # Check if view_id already exists
+        existing = await db.views.find_one({"project": project, "view_id": view_data.view_id})
+        if existing:
+            raise HTTPException(status_code=400, detail="View with this ID already exists")
+        
+        view = View(**view_data.model_dump())
+        doc = view.model_dump()
+        doc['created_at'] = doc['created_at'].isoformat()
+        doc['project'] = project
+        
+        try:
+            await db.views.insert_one(doc)
+        except DuplicateKeyError:
+            raise HTTPException(status_code=400, detail="View with this ID already exists")
+        await record_write(project, [history_change("view", doc['view_id'], None, doc)], view_stats_delta(doc))
+        return view
 
 @api_router.put("/views/{view_id}", response_model=View)
-async def update_view(view_id: int, update_data: ViewUpdate):
+async def update_view(view_id: int, update_data: ViewUpdate, project: str = DEFAULT_PROJECT):
     """Update a view"""
-    update_dict = {k: v for k, v in update_data.model_dump().items() if v is not None}
-    
-    if not update_dict:
-        raise HTTPException(status_code=400, detail="No fields to update")
-    
-    result = await db.views.update_one(
-        {"view_id": view_id},
-        {"$set": update_dict}
-    )
-    
-    if result.matched_count == 0:
-        raise HTTPException(status_code=404, detail="View not found")
-    
-    view = await db.views.find_one({"view_id": view_id}, {"_id": 0})
-    if isinstance(view.get('created_at'), str):
-        view['created_at'] = datetime.fromisoformat(view['created_at'])
-    
-    return view
+    await resolve_project(project, materialize=True)
+    async with graph_write_lock(project):
+        update_dict = {k: v for k, v in update_data.model_dump().items() if v is not None}
+        
+        if not update_dict:
+            raise HTTPException(status_code=400, detail="No fields to update")
+        
+        before = await db.views.find_one_and_update(
+            {"project": project, "view_id": view_id},
+            {"$set": update_dict},
+            projection={"_id": 0}
+        )
+        
+        if before is None:
+            raise HTTPException(status_code=404, detail="View not found")
+        
+        view = {**before, **update_dict}
+        # Counter.subtract rather than "-", which would drop negative counts
+        stats_delta = view_stats_delta(view)
+        stats_delta.subtract(view_stats_delta(before))
+        await record_write(project, [history_change("view", view_id, before, view)], stats_delta)
+        if isinstance(view.get('created_at'), str):
+            view['created_at'] = datetime.fromisoformat(view['created_at'])
+        
+        return view
 
 @api_router.delete("/views/{view_id}")
-async def delete_view(view_id: int):
+async def delete_view(view_id: int, project: str = DEFAULT_PROJECT):
     """Delete a view and its relations"""
-    result = await db.views.delete_one({"view_id": view_id})
-    
-    if result.deleted_count == 0:
-        raise HTTPException(status_code=404, detail="View not found")
-    
-    # Also delete related relations
-    await db.view_relations.delete_many({
-        "$or": [{"id_view1": view_id}, {"id_view2": view_id}]
-    })
-    
-    return {"message": "View and related relations deleted"}
+    await resolve_project(project, materialize=True)
+    async with graph_write_lock(project):
+        view = await db.views.find_one_and_delete({"project": project, "view_id": view_id}, projection={"_id": 0})
+        
+        if view is None:
+            raise HTTPException(status_code=404, detail="View not found")
+        
+        # Also delete related relations
+        relation_query = {"project": project, "$or": [{"id_view1": view_id}, {"id_view2": view_id}]}
+        related = await db.view_relations.find(relation_query, {"_id": 0}).to_list(10000)
+        await db.view_relations.delete_many(relation_query)
+        
+        stats_delta = view_stats_delta(view, -1)
+        degree_changes = Counter()
+        for relation in related:
+            stats_delta.update(relation_stats_delta(relation, -1))
+            degree_changes.update(relation_degree_changes(relation, -1, exclude=view_id))
+        
+        await record_write(
+            project,
+            [history_change("relation", r['id'], r, None) for r in related]
+            + [history_change("view", view_id, view, None)],
+            stats_delta,
+            degree_changes
+        )
+        return {"message": "View and related relations deleted"}
 
 # ============ VIEW RELATION ENDPOINTS ============
 
 @api_router.get("/relations", response_model=List[ViewRelation])
 async def get_relations(
     view_id: Optional[int] = None,
-    search: Optional[str] = None
+    search: Optional[str] = None,
+    join_type: Optional[str] = None,
+    join_table: Optional[str] = None,
+    join_column: Optional[str] = None,
+    predicate_hash: Optional[str] = None,
+    project: str = DEFAULT_PROJECT
 ):
     """Get all relations with optional filtering"""
-    query = {}
+    doc = await resolve_project(project)
+    query = join_filter_query(join_type, join_table, join_column, predicate_hash)
     
     if view_id is not None:
         query["$or"] = [{"id_view1": view_id}, {"id_view2": view_id}]
@@ -326,7 +1831,8 @@ async def get_relations(
     if search:
         query["relation"] = {"$regex": search, "$options": "i"}
     
-    relations = await db.view_relations.find(query, {"_id": 0}).to_list(10000)
+    async with read_limiter.slot():
+        relations = await find_in_project(doc, "relation", query)
     
     for rel in relations:
         if isinstance(rel.get('created_at'), str):
@@ -335,9 +1841,11 @@ async def get_relations(
     return relations
 
 @api_router.get("/relations/{relation_id}", response_model=ViewRelation)
-async def get_relation(relation_id: str):
+async def get_relation(relation_id: str, project: str = DEFAULT_PROJECT):
     """Get a single relation by id"""
-    relation = await db.view_relations.find_one({"id": relation_id}, {"_id": 0})
+    doc = await resolve_project(project)
+    found = await find_in_project(doc, "relation", {"id": relation_id}, limit=1)
+    relation = found[0] if found else None
     if not relation:
         raise HTTPException(status_code=404, detail="Relation not found")
     
@@ -347,168 +1855,464 @@ async def get_relation(relation_id: str):
     return relation
 
 @api_router.post("/relations", response_model=ViewRelation)
-async def create_relation(relation_data: ViewRelationCreate):
+async def create_relation(relation_data: ViewRelationCreate, project: str = DEFAULT_PROJECT):
     """Create a new relation"""
-    # Verify both views exist
-    view1 = await db.views.find_one({"view_id": relation_data.id_view1})
-    view2 = await db.views.find_one({"view_id": relation_data.id_view2})
-    
-    if not view1 or not view2:
-        raise HTTPException(status_code=400, detail="One or both views do not exist")
-    
-    relation = ViewRelation(**relation_data.model_dump())
-    doc = relation.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    
-    await db.view_relations.insert_one(doc)
-    return relation
+    await resolve_project(project, materialize=True)
+    async with graph_write_lock(project):
+        # Verify both views exist
+        view1 = await db.views.find_one({"project": project, "view_id": relation_data.id_view1})
+        view2 = await db.views.find_one({"project": project, "view_id": relation_data.id_view2})
+        
+        if not view1 or not view2:
+            raise HTTPException(status_code=400, detail="One or both views do not exist")
+        
+        relation = ViewRelation(**relation_data.model_dump(), **extract_join_metadata(relation_data.relation))
+        doc = relation.model_dump()
+        doc['created_at'] = doc['created_at'].isoformat()
+        doc['project'] = project
+        
+        await db.view_relations.insert_one(doc)
+        await record_write(
+            project,
+            [history_change("relation", doc['id'], None, doc)],
+            relation_stats_delta(doc),
+            relation_degree_changes(doc)
+        )
+        return relation
 
 @api_router.put("/relations/{relation_id}", response_model=ViewRelation)
-async def update_relation(relation_id: str, update_data: ViewRelationUpdate):
+async def update_relation(relation_id: str, update_data: ViewRelationUpdate, project: str = DEFAULT_PROJECT):
     """Update a relation"""
-    update_dict = {k: v for k, v in update_data.model_dump().items() if v is not None}
-    
-    if not update_dict:
-        raise HTTPException(status_code=400, detail="No fields to update")
-    
-    result = await db.view_relations.update_one(
-        {"id": relation_id},
-        {"$set": update_dict}
-    )
-    
-    if result.matched_count == 0:
-        raise HTTPException(status_code=404, detail="Relation not found")
-    
-    relation = await db.view_relations.find_one({"id": relation_id}, {"_id": 0})
-    if isinstance(relation.get('created_at'), str):
-        relation['created_at'] = datetime.fromisoformat(relation['created_at'])
-    
-    return relation
+    await resolve_project(project, materialize=True)
+    async with graph_write_lock(project):
+        update_dict = {k: v for k, v in update_data.model_dump().items() if v is not None}
+        
+        if not update_dict:
+            raise HTTPException(status_code=400, detail="No fields to update")
+        
+        if 'relation' in update_dict:
+            update_dict.update(extract_join_metadata(update_dict['relation']))
+        
+        before = await db.view_relations.find_one_and_update(
+            {"project": project, "id": relation_id},
+            {"$set": update_dict},
+            projection={"_id": 0}
+        )
+        
+        if before is None:
+            raise HTTPException(status_code=404, detail="Relation not found")
+        
+        relation = {**before, **update_dict}
+        stats_delta = relation_stats_delta(relation)
+        stats_delta.subtract(relation_stats_delta(before))
+        await record_write(project, [history_change("relation", relation_id, before, relation)], stats_delta)
+        if isinstance(relation.get('created_at'), str):
+            relation['created_at'] = datetime.fromisoformat(relation['created_at'])
+        
+        return relation
 
 @api_router.delete("/relations/{relation_id}")
-async def delete_relation(relation_id: str):
+async def delete_relation(relation_id: str, project: str = DEFAULT_PROJECT):
     """Delete a relation"""
-    result = await db.view_relations.delete_one({"id": relation_id})
-    
-    if result.deleted_count == 0:
-        raise HTTPException(status_code=404, detail="Relation not found")
-    
-    return {"message": "Relation deleted"}
+    await resolve_project(project, materialize=True)
+    async with graph_write_lock(project):
+        relation = await db.view_relations.find_one_and_delete({"project": project, "id": relation_id}, projection={"_id": 0})
+        
+        if relation is None:
+            raise HTTPException(status_code=404, detail="Relation not found")
+        
+        await record_write(
+            project,
+            [history_change("relation", relation_id, relation, None)],
+            relation_stats_delta(relation, -1),
+            relation_degree_changes(relation, -1)
+        )
+        return {"message": "Relation deleted"}
 
 # ============ SQL IMPORT ENDPOINT ============
 
 @api_router.post("/import-sql", response_model=SqlImportResponse)
-async def import_sql(request: SqlImportRequest):
+async def import_sql(request: SqlImportRequest, project: str = DEFAULT_PROJECT):
     """Import views and relations from SQL INSERT statements"""
-    sql = request.sql
-    views_created = 0
-    relations_created = 0
-    errors = []
-    
-    # Split by semicolon and process each statement
-    statements = [s.strip() for s in sql.split(';') if s.strip()]
-    
-    for stmt in statements:
-        if 'Report_View' in stmt and 'Report_ViewRelation' not in stmt:
-            parsed = parse_view_insert(stmt)
-            if parsed:
-                try:
-                    # Check if exists
-                    existing = await db.views.find_one({"view_id": parsed['view_id']})
-                    if not existing:
-                        view = View(**parsed)
-                        doc = view.model_dump()
-                        doc['created_at'] = doc['created_at'].isoformat()
-                        await db.views.insert_one(doc)
-                        views_created += 1
-                except Exception as e:
-                    errors.append(f"Error creating view: {str(e)}")
-        
-        elif 'Report_ViewRelation' in stmt:
-            parsed = parse_view_relation_insert(stmt)
-            if parsed:
-                try:
-                    # Auto-create views if they don't exist
-                    for vid in [parsed['id_view1'], parsed['id_view2']]:
-                        existing = await db.views.find_one({"view_id": vid})
+    await resolve_project(project, materialize=True)
+    async with graph_write_lock(project):
+        sql = request.sql
+        views_created = 0
+        relations_created = 0
+        errors = []
+        changes = []
+        stats_delta = Counter()
+        degree_changes = Counter()
+        
+        # Split by semicolon and process each statement
+        statements = split_sql_statements(sql)
+        
+        for stmt in statements:
+            if 'Report_View' in stmt and 'Report_ViewRelation' not in stmt:
+                parsed = parse_view_insert(stmt)
+                if parsed:
+                    try:
+                        # Check if exists
+                        existing = await db.views.find_one({"project": project, "view_id": parsed['view_id']})
                         if not existing:
-                            # Create placeholder view
-                            view = View(view_id=vid, name=f"View_{vid}")
+                            view = View(**parsed)
                             doc = view.model_dump()
                             doc['created_at'] = doc['created_at'].isoformat()
+                            doc['project'] = project
                             await db.views.insert_one(doc)
+                            changes.append(history_change("view", doc['view_id'], None, doc))
+                            stats_delta.update(view_stats_delta(doc))
                             views_created += 1
-                    
-                    relation = ViewRelation(**parsed)
-                    doc = relation.model_dump()
-                    doc['created_at'] = doc['created_at'].isoformat()
-                    await db.view_relations.insert_one(doc)
-                    relations_created += 1
-                except Exception as e:
-                    errors.append(f"Error creating relation: {str(e)}")
-    
-    return SqlImportResponse(
-        views_created=views_created,
-        relations_created=relations_created,
-        errors=errors
-    )
+                    except DuplicateKeyError:
+                        # Stored meanwhile, which the existence check treats as already imported
+                        pass
+                    except Exception as e:
+                        errors.append(f"Error creating view: {str(e)}")
+                elif re.match(r"INSERT\s+INTO\s+Report_View\b", stmt, re.IGNORECASE):
+                    errors.append(f"Could not parse view statement: {stmt[:120]}")
+            
+            elif 'Report_ViewRelation' in stmt:
+                parsed = parse_view_relation_insert(stmt)
+                if parsed:
+                    try:
+                        # Auto-create views if they don't exist
+                        for vid in [parsed['id_view1'], parsed['id_view2']]:
+                            existing = await db.views.find_one({"project": project, "view_id": vid})
+                            if not existing:
+                                # Create placeholder view
+                                view = View(view_id=vid, name=f"View_{vid}")
+                                doc = view.model_dump()
+                                doc['created_at'] = doc['created_at'].isoformat()
+                                doc['project'] = project
+                                try:
+                                    await db.views.insert_one(doc)
+                                except DuplicateKeyError:
+                                    continue
+                                changes.append(history_change("view", doc['view_id'], None, doc))
+                                stats_delta.update(view_stats_delta(doc))
+                                views_created += 1
+                        
+                        relation = ViewRelation(**parsed, **extract_join_metadata(parsed['relation']))
+                        doc = relation.model_dump()
+                        doc['created_at'] = doc['created_at'].isoformat()
+                        doc['project'] = project
+                        await db.view_relations.insert_one(doc)
+                        changes.append(history_change("relation", doc['id'], None, doc))
+                        stats_delta.update(relation_stats_delta(doc))
+                        degree_changes.update(relation_degree_changes(doc))
+                        relations_created += 1
+                    except Exception as e:
+                        errors.append(f"Error creating relation: {str(e)}")
+                elif re.match(r"INSERT\s+INTO\s+Report_ViewRelation\b", stmt, re.IGNORECASE):
+                    errors.append(f"Could not parse relation statement: {stmt[:120]}")
+        
+        # One stats update for the whole import rather than one per statement
+        await record_write(project, changes, stats_delta, degree_changes)
+        
+        return SqlImportResponse(
+            views_created=views_created,
+            relations_created=relations_created,
+            errors=errors
+        )
 
 # ============ GRAPH DATA ENDPOINT ============
 
+async def build_graph_data(project: str) -> bytes:
+    """Load a project's graph, encode it once and refresh its graph cache"""
+    async with read_limiter.slot():
+        # Read the version first so the cached body is never labelled newer than its data
+        version = await read_graph_version(project)
+        views = await db.views.find({"project": project}, {"_id": 0}).to_list(10000)
+        relations = await db.view_relations.find({"project": project}, {"_id": 0}).to_list(10000)
+    
+    # Format for frontend
+    nodes = [view_to_node(v) for v in views]
+    edges = [relation_to_edge(r) for r in relations]
+    
+    body = json.dumps({"nodes": nodes, "edges": edges}).encode()
+    get_graph_cache(project).store(version, body, len(nodes), len(edges))
+    run_in_background(persist_graph_snapshot(project))
+    return body
+
+async def build_filtered_graph_data(project: dict, relation_query: dict) -> dict:
+    """Load only the relations matching a JOIN filter and the views they connect"""
+    async with read_limiter.slot():
+        relations = await find_in_project(project, "relation", relation_query)
+        view_ids = list({r['id_view1'] for r in relations} | {r['id_view2'] for r in relations})
+        views = await find_in_project(project, "view", {"view_id": {"$in": view_ids}})
+    
+    return {
+        "nodes": [view_to_node(v) for v in views],
+        "edges": [relation_to_edge(r) for r in relations]
+    }
+
+async def current_graph_cache(project: str) -> GraphCache:
+    """Get a project's graph cache, caught up to the latest version it knows of"""
+    cache = get_graph_cache(project)
+    if GRAPH_MULTI_WORKER or not cache.checked_at:
+        await sync_graph_version(project)
+    if not cache.is_current:
+        await refresh_graph_cache(project)
+    return cache
+
 @api_router.get("/graph-data")
-async def get_graph_data():
+async def get_graph_data(
+    join_type: Optional[str] = None,
+    join_table: Optional[str] = None,
+    join_column: Optional[str] = None,
+    predicate_hash: Optional[str] = None,
+    project: str = DEFAULT_PROJECT
+):
     """Get all data formatted for graph visualization"""
-    views = await db.views.find({}, {"_id": 0}).to_list(10000)
-    relations = await db.view_relations.find({}, {"_id": 0}).to_list(10000)
+    doc = await resolve_project(project)
+    relation_query = join_filter_query(join_type, join_table, join_column, predicate_hash)
+    if relation_query:
+        return await build_filtered_graph_data(doc, relation_query)
     
-    # Format for frontend
-    nodes = []
-    for v in views:
-        display_name = v.get('alias') or v.get('name', f"View_{v['view_id']}")
-        nodes.append({
-            "id": str(v['view_id']),
-            "view_id": v['view_id'],
-            "name": v.get('name', ''),
-            "name2": v.get('name2'),
-            "alias": v.get('alias'),
-            "min_app_version": v.get('min_app_version', 0),
-            "max_app_version": v.get('max_app_version', 999999),
-            "display_name": display_name
-        })
+    if doc.get('materialized'):
+        cache = await current_graph_cache(project)
+        body, version = cache.body(), cache.version
+    else:
+        # An untouched clone looks exactly like its source did when cloned
+        source = await current_graph_cache(doc['clone_of'])
+        version = 0
+        if source.version == doc['clone_version']:
+            body = source.body()
+        else:
+            async with read_limiter.slot():
+                views, relations = await pending_clone_state(doc)
+            body = json.dumps({
+                "nodes": [view_to_node(v) for v in views],
+                "edges": [relation_to_edge(r) for r in relations]
+            }).encode()
+    
+    if startup_metrics["first_graph_read_ms"] is None:
+        startup_metrics["first_graph_read_ms"] = round((time.monotonic() - PROCESS_START) * 1000, 3)
+    return GraphResponse(content=body, headers={"X-Graph-Version": str(version)})
+
+# ============ EXPORT ENDPOINT ============
+
+def sql_literal(value) -> str:
+    if value is None:
+        return "NULL"
+    if isinstance(value, int):
+        return str(value)
+    # Quotes doubled and backslashes escaped, which parse_insert and the frontend both read back
+    return "'" + str(value).replace("\\", "\\\\").replace("'", "''") + "'"
+
+def sql_insert(table: str, row: dict) -> str:
+    return (f"INSERT INTO {table} ({', '.join(row)}) "
+            f"VALUES ({', '.join(sql_literal(v) for v in row.values())});")
+
+@api_router.get("/export")
+async def export_sql(project: str = DEFAULT_PROJECT):
+    """Export a project as SQL INSERT statements that /import-sql accepts"""
+    doc = await resolve_project(project)
+    async with read_limiter.slot():
+        views = sorted(await find_in_project(doc, "view", {}, limit=None), key=lambda v: v['view_id'])
+        relations = await find_in_project(doc, "relation", {}, limit=None)
     
-    edges = []
-    for r in relations:
-        edges.append({
-            "id": r['id'],
-            "source": str(r['id_view1']),
-            "target": str(r['id_view2']),
-            "relation": r.get('relation', ''),
-            "relation2": r.get('relation2'),
-            "edge_weight": r.get('edge_weight', 10)
+    statements = [
+        sql_insert("Report_View", {
+            "IdView": v['view_id'],
+            "Name": v.get('name'),
+            "Name2": v.get('name2'),
+            "Alias": v.get('alias'),
+            "MinAppVersion": v.get('min_app_version'),
+            "MaxAppVersion": v.get('max_app_version')
+        })
+        for v in views
+    ]
+    statements += [
+        sql_insert("Report_ViewRelation", {
+            "IdView1": r['id_view1'],
+            "IdView2": r['id_view2'],
+            "Relation": r.get('relation'),
+            "Relation2": r.get('relation2'),
+            "EdgeWeight": r.get('edge_weight'),
+            "MinAppVersion": r.get('min_app_version'),
+            "MaxAppVersion": r.get('max_app_version'),
+            "ChangeOwner": r.get('change_owner')
         })
+        for r in relations
+    ]
+    return {"project": project, "sql": "\n".join(statements)}
+
+# ============ CHANGE FEED ENDPOINT ============
+
+@api_router.get("/changes")
+async def stream_changes(
+    since: Optional[int] = None,
+    last_event_id: Optional[str] = Header(None),
+    project: str = DEFAULT_PROJECT
+):
+    """Stream a project's graph patches as server-sent events"""
+    await resolve_project(project)
+    # EventSource resends the last seen id on reconnect, so it can resume
+    last_seq = since
+    if last_seq is None and last_event_id and last_event_id.isdigit():
+        last_seq = int(last_event_id)
     
-    return {"nodes": nodes, "edges": edges}
+    feed = get_change_feed(project)
+    queue = feed.subscribe(last_seq)
+    return StreamingResponse(
+        stream_change_events(feed, queue, feed.seq),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# ============ METRICS ENDPOINT ============
+
+@api_router.get("/metrics")
+async def get_metrics():
+    """Get read coalescing and load shedding metrics"""
+    return {
+        "reads": read_limiter.metrics(),
+        "single_flight": {
+            "leaders": read_flight.leaders,
+            "joined": read_flight.joined
+        },
+        "graph_cache": {
+            project: {
+                "version": cache.version,
+                "latest_version": cache.latest_version,
+                "nodes": cache.node_count,
+                "edges": cache.edge_count
+            }
+            for project, cache in graph_caches.items()
+        },
+        "startup": startup_metrics
+    }
+
+# ============ HISTORY ENDPOINTS ============
+
+@api_router.get("/history")
+async def get_history(limit: int = 50, project: str = DEFAULT_PROJECT):
+    """List the most recent changes and what can be undone or redone"""
+    doc = await resolve_project(project)
+    if not doc.get('materialized'):
+        # An untouched clone has no history of its own yet
+        return {"entries": [], "undo_available": 0, "redo_available": 0}
+    entries = await db.graph_changes.find(
+        {"project": project},
+        {"_id": 0, "version": 1, "kind": 1, "target": 1, "reset": 1, "changes": 1, "created_at": 1}
+    ).sort("version", -1).limit(limit).to_list(limit)
+    stacks = await db.graph_meta.find_one({"_id": meta_id("history", project)}) or {}
+    
+    return {
+        "entries": [
+            {
+                "version": e['version'],
+                "kind": e.get('kind', 'write'),
+                "target": e.get('target'),
+                "reset": e.get('reset', False),
+                "changes": len(e['changes']) if e.get('changes') is not None else None,
+                "created_at": e['created_at']
+            }
+            for e in entries
+        ],
+        "undo_available": len(stacks.get('undo', [])),
+        "redo_available": len(stacks.get('redo', []))
+    }
+
+@api_router.get("/history/graph")
+async def get_history_graph(
+    version: Optional[int] = None,
+    at: Optional[datetime] = None,
+    project: str = DEFAULT_PROJECT
+):
+    """Get the graph as it was at a version or point in time"""
+    doc = await resolve_project(project)
+    if at is not None and at.tzinfo is None:
+        at = at.replace(tzinfo=timezone.utc)
+    if doc.get('materialized'):
+        current, views, relations = await graph_state_at(project, version=version, at=at)
+        views, relations = views.values(), relations.values()
+    else:
+        # Version 0 is the clone's only version until its first write
+        current = 0
+        views, relations = await pending_clone_state(doc)
+    return {
+        "version": current,
+        "nodes": [view_to_node(v) for v in views],
+        "edges": [relation_to_edge(r) for r in relations]
+    }
+
+@api_router.post("/history/undo")
+async def undo_change(project: str = DEFAULT_PROJECT):
+    """Undo the most recent change that has not been undone yet"""
+    await resolve_project(project, materialize=True)
+    async with graph_write_lock(project):
+        entry = await pop_history(project, "undo")
+        if entry is None:
+            raise HTTPException(status_code=409, detail="Nothing to undo")
+        
+        target = entry['version']
+        try:
+            if entry.get('reset'):
+                version = await restore_graph_before(project, entry)
+            else:
+                version = await restore_states(project, entry, "before", "undo")
+        except HTTPException:
+            # e.g. the history before a reset was compacted away; nothing was changed yet
+            await push_history_stack(project, "undo", target)
+            raise
+        
+        await push_history_stack(project, "redo", target)
+        return {"message": "Change undone", "undone": target, "version": version}
+
+@api_router.post("/history/redo")
+async def redo_change(project: str = DEFAULT_PROJECT):
+    """Redo the most recently undone change"""
+    await resolve_project(project, materialize=True)
+    async with graph_write_lock(project):
+        entry = await pop_history(project, "redo")
+        if entry is None:
+            raise HTTPException(status_code=409, detail="Nothing to redo")
+        
+        target = entry['version']
+        if entry.get('reset'):
+            version = await clear_graph(project, kind="redo", target=target)
+        else:
+            version = await restore_states(project, entry, "after", "redo")
+        return {"message": "Change redone", "redone": target, "version": version}
 
 # ============ CLEAR DATA ENDPOINT ============
 
 @api_router.delete("/clear-all")
-async def clear_all_data():
-    """Clear all views and relations"""
-    await db.views.delete_many({})
-    await db.view_relations.delete_many({})
-    return {"message": "All data cleared"}
+async def clear_all_data(project: str = DEFAULT_PROJECT):
+    """Clear all views and relations of a project"""
+    await resolve_project(project, materialize=True)
+    async with graph_write_lock(project):
+        await clear_graph(project)
+        return {"message": "All data cleared"}
 
 # ============ STATS ENDPOINT ============
 
 @api_router.get("/stats")
-async def get_stats():
-    """Get database statistics"""
-    views_count = await db.views.count_documents({})
-    relations_count = await db.view_relations.count_documents({})
-    return {
-        "views_count": views_count,
-        "relations_count": relations_count
-    }
+async def get_stats(project: str = DEFAULT_PROJECT):
+    """Get database statistics from the maintained stats document"""
+    doc = await resolve_project(project)
+    stats_id = meta_id("stats", project)
+    stats = await db.graph_meta.find_one({"_id": stats_id}, {"_id": 0})
+    if stats is None or 'reconciled_at' not in stats:
+        if doc.get('materialized'):
+            # First call after upgrading: build the document once
+            await reconcile_stats(project)
+        else:
+            # A clone made before stats were copied at clone time; its graph cannot change until written
+            views, relations = await pending_clone_state(doc)
+            counted, _ = compute_stats(views, relations)
+            counted["reconciled_at"] = datetime.now(timezone.utc).isoformat()
+            await db.graph_meta.replace_one({"_id": stats_id}, counted, upsert=True)
+        stats = await db.graph_meta.find_one({"_id": stats_id}, {"_id": 0})
+    
+    for field in ('revision', 'writing', 'writing_at'):
+        stats.pop(field, None)
+    result = {**empty_stats(), **stats}
+    for section in STATS_SECTIONS:
+        result[section] = {k: v for k, v in result[section].items() if v}
+    return result
 
 # Include the router in the main app
 app.include_router(api_router)
@@ -519,6 +2323,8 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    # Lets browser clients match a fetched graph against the change feed
+    expose_headers=["X-Graph-Version"],
 )
 
 # Configure logging
@@ -528,6 +2334,148 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Error codes of dropping an index another worker already dropped
+INDEX_NOT_FOUND_CODES = (26, 27)
+
+async def drop_index_if_present(collection, name: str):
+    """Drop an index, tolerating workers racing to drop it on the same startup"""
+    if name not in await collection.index_information():
+        return
+    try:
+        await collection.drop_index(name)
+    except OperationFailure as e:
+        if e.code not in INDEX_NOT_FOUND_CODES:
+            raise
+
+async def ensure_indexes():
+    # The change log used to expire through a TTL index; retention is now handled by compaction
+    indexes = await db.graph_changes.index_information()
+    if 'expireAfterSeconds' in indexes.get('created_at_1', {}):
+        await drop_index_if_present(db.graph_changes, 'created_at_1')
+    await db.graph_changes.create_index([("project", 1), ("version", 1)], unique=True)
+    await db.graph_changes.create_index("created_at")
+    await db.graph_checkpoints.create_index([("project", 1), ("version", 1)], unique=True)
+    await db.graph_checkpoints.create_index([("project", 1), ("created_at", 1)])
+    # The lookup index used to allow duplicates, which concurrent creates could insert
+    view_index = (await db.views.index_information()).get('project_1_view_id_1')
+    if view_index and not view_index.get('unique'):
+        await deduplicate_views()
+        await drop_index_if_present(db.views, 'project_1_view_id_1')
+    await db.views.create_index([("project", 1), ("view_id", 1)], unique=True)
+    for field in ("id", "id_view1", "id_view2", *JOIN_FIELDS):
+        await db.view_relations.create_index([("project", 1), (field, 1)])
+    await db.projects.create_index("key", unique=True)
+    await db.projects.create_index("clone_of")
+
+async def deduplicate_views():
+    """Delete repeated view_ids within a project, keeping the view stored first"""
+    pipeline = [
+        {"$group": {"_id": {"project": "$project", "view_id": "$view_id"}, "ids": {"$push": "$_id"}}},
+        {"$match": {"ids.1": {"$exists": True}}}
+    ]
+    changed = set()
+    async for group in db.views.aggregate(pipeline, allowDiskUse=True):
+        await db.views.delete_many({"_id": {"$in": sorted(group['ids'])[1:]}})
+        changed.add(group['_id']['project'])
+    
+    for project in changed:
+        logger.warning(f"Removed duplicate view ids from project {project}")
+        async with graph_write_lock(project):
+            await reconcile_stats(project, holding_lock=True)
+            await record_write(project, None, kind="migrate")
+
+async def migrate_to_projects():
+    """Move data stored before projects existed into the default project"""
+    # Unique first, so workers booting together cannot each insert a default project
+    await db.projects.create_index("key", unique=True)
+    try:
+        await db.projects.update_one(
+            {"key": DEFAULT_PROJECT},
+            {"$setOnInsert": Project(key=DEFAULT_PROJECT, name="Default").model_dump()},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # Another worker's upsert won the race
+        pass
+    if await db.graph_meta.find_one({"_id": "schema", "projects": True}):
+        return
+    
+    for collection in (db.views, db.view_relations, db.graph_changes, db.graph_checkpoints):
+        await collection.update_many({"project": {"$exists": False}}, {"$set": {"project": DEFAULT_PROJECT}})
+    # Unprefixed indexes scan every project and a unique version would collide across them
+    legacy_indexes = (
+        (db.graph_changes, ["version_1"]),
+        (db.graph_checkpoints, ["version_1", "created_at_1"]),
+        (db.view_relations, ["join_type_1", "join_tables_1", "join_columns_1", "predicate_hash_1"])
+    )
+    for collection, names in legacy_indexes:
+        for name in names:
+            await drop_index_if_present(collection, name)
+    await db.graph_meta.update_one({"_id": "schema"}, {"$set": {"projects": True}}, upsert=True)
+
+async def backfill_join_metadata():
+    """Extract JOIN metadata for relations stored without it or by an older parser"""
+    schema = await db.graph_meta.find_one({"_id": "schema"}) or {}
+    reparse = schema.get('join_parser', 1) < JOIN_PARSER_VERSION
+    query = {} if reparse else {"join_type": {"$exists": False}}
+    
+    for project in await db.view_relations.distinct("project", query):
+        # Under the write lock so a concurrent edit cannot get metadata parsed from its old text
+        async with graph_write_lock(project):
+            changed = False
+            cursor = db.view_relations.find(
+                {"project": project, **query}, {"_id": 1, "relation": 1, **{k: 1 for k in JOIN_FIELDS}}
+            )
+            async for relation in cursor:
+                metadata = extract_join_metadata(relation.get('relation'))
+                if all(relation.get(k) == v for k, v in metadata.items()):
+                    continue
+                await db.view_relations.update_one({"_id": relation['_id']}, {"$set": metadata})
+                changed = True
+            
+            # New JOIN types move stats buckets and edge fields, so rebuild both
+            if changed:
+                await reconcile_stats(project, holding_lock=True)
+                await record_write(project, None, kind="migrate")
+    if reparse:
+        await db.graph_meta.update_one({"_id": "schema"}, {"$set": {"join_parser": JOIN_PARSER_VERSION}}, upsert=True)
+
+async def reconcile_graph_snapshot():
+    """Check the snapshot against Mongo and catch the cache up if it is behind"""
+    try:
+        await backfill_join_metadata()
+        await sync_graph_version(DEFAULT_PROJECT, force=True)
+        if not get_graph_cache(DEFAULT_PROJECT).is_current:
+            await refresh_graph_cache(DEFAULT_PROJECT)
+        startup_metrics["reconciled_ms"] = round((time.monotonic() - PROCESS_START) * 1000, 3)
+    except Exception as e:
+        logger.warning(f"Graph snapshot reconciliation failed: {e}")
+    
+    if GRAPH_MULTI_WORKER:
+        await watch_graph_version()
+
+@app.on_event("startup")
+async def load_graph_snapshot():
+    # Every project-scoped query and background job relies on the project
+    # field and its unique indexes, so these finish before reporting ready
+    await migrate_to_projects()
+    await ensure_indexes()
+    graph_cache = get_graph_cache(DEFAULT_PROJECT)
+    if graph_cache.is_loaded:
+        startup_metrics["source"] = "snapshot"
+        logger.info(f"Loaded graph snapshot v{graph_cache.version} "
+                    f"({graph_cache.node_count} nodes, {graph_cache.edge_count} edges)")
+    else:
+        startup_metrics["source"] = "mongo"
+    startup_metrics["ready_ms"] = round((time.monotonic() - PROCESS_START) * 1000, 3)
+    run_in_background(reconcile_graph_snapshot())
+    run_in_background(reconcile_stats_periodically())
+    run_in_background(compact_history_periodically())
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    for task in list(background_tasks):
+        task.cancel()
+    for project in list(graph_caches):
+        await persist_graph_snapshot(project)
     client.close()
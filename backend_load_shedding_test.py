@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""Load shedding harness.
+
+Starts the backend with a single read slot and a one-request queue, seeds
+enough views that listing them takes a while, then fires a burst of
+concurrent /api/views reads. Expects some reads to be admitted and the
+rest to be shed with 503 and a Retry-After header.
+
+Requires a reachable MongoDB (MONGO_URL) and the backend requirements.
+"""
+
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+from pymongo import MongoClient
+
+BACKEND_DIR = Path(__file__).parent / "backend"
+PORT = int(os.environ.get("HARNESS_PORT", "8012"))
+BURST = int(os.environ.get("HARNESS_BURST", "32"))
+SEED_VIEWS = int(os.environ.get("HARNESS_SEED_VIEWS", "3000"))
+MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+DB_NAME = os.environ.get("HARNESS_DB_NAME", "relation_graph_load_shedding_test")
+
+
+class LoadSheddingHarness:
+    def __init__(self):
+        self.api_url = f"http://127.0.0.1:{PORT}/api"
+        self.mongo = MongoClient(MONGO_URL)
+        self.server = None
+
+    def start_server(self):
+        env = {
+            **os.environ,
+            "MONGO_URL": MONGO_URL,
+            "DB_NAME": DB_NAME,
+            "READ_MAX_CONCURRENCY": "1",
+            "READ_MAX_QUEUE": "1",
+            "READ_QUEUE_TIMEOUT_S": "5",
+            "GRAPH_SNAPSHOT_PATH": f"/tmp/{DB_NAME}.snapshot",
+        }
+        self.server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "server:app", "--port", str(PORT)],
+            cwd=BACKEND_DIR,
+            env=env,
+        )
+        for _ in range(100):
+            try:
+                if requests.get(f"{self.api_url}/stats", timeout=1).status_code == 200:
+                    return
+            except requests.RequestException:
+                pass
+            time.sleep(0.1)
+        raise RuntimeError("Backend did not start")
+
+    def stop_server(self):
+        if self.server:
+            self.server.terminate()
+            self.server.wait(timeout=10)
+
+    def seed(self):
+        sql = ";\n".join(
+            f"INSERT INTO Report_View (IdView, Name) VALUES({i}, 'Seed_{i}')"
+            for i in range(1, SEED_VIEWS + 1)
+        )
+        requests.post(f"{self.api_url}/import-sql", json={"sql": sql}, timeout=120).raise_for_status()
+
+    def burst(self):
+        barrier = threading.Barrier(BURST)
+
+        def read(_):
+            barrier.wait()
+            return requests.get(f"{self.api_url}/views", timeout=30)
+
+        with ThreadPoolExecutor(max_workers=BURST) as pool:
+            return list(pool.map(read, range(BURST)))
+
+    def run(self):
+        self.mongo.drop_database(DB_NAME)
+        self.start_server()
+        try:
+            self.seed()
+            responses = self.burst()
+            metrics = requests.get(f"{self.api_url}/metrics", timeout=10).json()
+        finally:
+            self.stop_server()
+            self.mongo.drop_database(DB_NAME)
+
+        admitted = [r for r in responses if r.status_code == 200]
+        shed = [r for r in responses if r.status_code == 503]
+        print(f"📊 Burst of {BURST}: {len(admitted)} admitted, {len(shed)} shed, "
+              f"limiter shed counter {metrics['reads']['shed']}")
+        if len(admitted) + len(shed) != BURST:
+            print(f"❌ Unexpected statuses: {sorted({r.status_code for r in responses})}")
+            return False
+        if not admitted or not shed:
+            print("❌ Expected the burst to be partly admitted and partly shed")
+            return False
+        if not all(r.headers.get("Retry-After") for r in shed):
+            print("❌ A shed response is missing Retry-After")
+            return False
+        print("✅ Excess reads were shed with 503 and Retry-After")
+        return True
+
+
+def main():
+    harness = LoadSheddingHarness()
+    try:
+        return 0 if harness.run() else 1
+    except KeyboardInterrupt:
+        print("\n⚠️  Harness interrupted by user")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
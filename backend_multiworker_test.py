@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""Multi-worker staleness harness.
+
+Starts the backend with several uvicorn workers in GRAPH_MULTI_WORKER mode,
+writes views through the API while reader threads poll /api/graph-data, and
+checks that no read started more than GRAPH_VERSION_MAX_LAG_MS (plus a small
+grace period) after a write completed still reports an older graph version.
+
+Requires a reachable MongoDB (MONGO_URL) and the backend requirements.
+"""
+
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import requests
+from pymongo import MongoClient
+
+BACKEND_DIR = Path(__file__).parent / "backend"
+PORT = int(os.environ.get("HARNESS_PORT", "8011"))
+WORKERS = int(os.environ.get("HARNESS_WORKERS", "4"))
+READERS = int(os.environ.get("HARNESS_READERS", "8"))
+WRITES = int(os.environ.get("HARNESS_WRITES", "50"))
+MAX_LAG_MS = int(os.environ.get("GRAPH_VERSION_MAX_LAG_MS", "1000"))
+GRACE_MS = int(os.environ.get("HARNESS_GRACE_MS", "250"))
+MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+DB_NAME = os.environ.get("HARNESS_DB_NAME", "relation_graph_multiworker_test")
+
+
+class MultiWorkerHarness:
+    def __init__(self):
+        self.api_url = f"http://127.0.0.1:{PORT}/api"
+        self.mongo = MongoClient(MONGO_URL)
+        self.writes = []  # (completed_at, version)
+        self.reads = []  # (started_at, version)
+        self.read_errors = 0
+        self.write_errors = 0
+        self.stop = threading.Event()
+        self.server = None
+
+    def start_server(self):
+        env = {
+            **os.environ,
+            "MONGO_URL": MONGO_URL,
+            "DB_NAME": DB_NAME,
+            "GRAPH_MULTI_WORKER": "true",
+            "GRAPH_VERSION_MAX_LAG_MS": str(MAX_LAG_MS),
+            "GRAPH_SNAPSHOT_PATH": f"/tmp/{DB_NAME}.snapshot",
+        }
+        self.server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "server:app",
+             "--port", str(PORT), "--workers", str(WORKERS)],
+            cwd=BACKEND_DIR,
+            env=env,
+        )
+        for _ in range(100):
+            try:
+                if requests.get(f"{self.api_url}/stats", timeout=1).status_code == 200:
+                    return
+            except requests.RequestException:
+                pass
+            time.sleep(0.1)
+        raise RuntimeError("Backend did not start")
+
+    def stop_server(self):
+        if self.server:
+            self.server.terminate()
+            self.server.wait(timeout=10)
+
+    def graph_version(self):
+        meta = self.mongo[DB_NAME].graph_meta.find_one({"_id": "graph"})
+        return meta["version"] if meta else 0
+
+    def reader(self):
+        session = requests.Session()
+        while not self.stop.is_set():
+            started_at = time.monotonic()
+            try:
+                response = session.get(f"{self.api_url}/graph-data", timeout=10)
+                if response.status_code == 200:
+                    self.reads.append((started_at, int(response.headers["X-Graph-Version"])))
+                else:
+                    self.read_errors += 1
+            except requests.RequestException:
+                self.read_errors += 1
+
+    def writer(self):
+        for i in range(WRITES):
+            response = requests.post(f"{self.api_url}/views", json={"view_id": 900000 + i, "name": f"Harness_{i}"}, timeout=10)
+            if response.status_code != 200:
+                self.write_errors += 1
+                continue
+            # Single writer, so the stored version right after the write is the write's version
+            self.writes.append((time.monotonic(), self.graph_version()))
+            time.sleep(0.05)
+
+    def check(self):
+        bound = (MAX_LAG_MS + GRACE_MS) / 1000
+        stale = []
+        for started_at, version in self.reads:
+            required = max((v for done_at, v in self.writes if done_at + bound <= started_at), default=0)
+            if version < required:
+                stale.append((started_at, version, required))
+        return stale
+
+    def run(self):
+        self.mongo.drop_database(DB_NAME)
+        self.start_server()
+        try:
+            readers = [threading.Thread(target=self.reader) for _ in range(READERS)]
+            for thread in readers:
+                thread.start()
+            self.writer()
+            time.sleep((MAX_LAG_MS + GRACE_MS) / 1000 * 2)
+            self.stop.set()
+            for thread in readers:
+                thread.join()
+        finally:
+            self.stop_server()
+            self.mongo.drop_database(DB_NAME)
+
+        stale = self.check()
+        print(f"📊 Writes: {len(self.writes)}, reads: {len(self.reads)}, "
+              f"read errors: {self.read_errors}, write errors: {self.write_errors}")
+        print(f"⏱️  Lag bound: {MAX_LAG_MS} ms (+{GRACE_MS} ms grace), workers: {WORKERS}")
+        # Without successful reads and writes there is nothing the lag check could have caught
+        if not self.reads or not self.writes or self.read_errors or self.write_errors:
+            print("❌ Reads or writes failed, so the lag bound was not exercised")
+            return False
+        if stale:
+            print(f"❌ {len(stale)} reads served a version older than the lag bound allows")
+            for started_at, version, required in stale[:10]:
+                print(f"  - read v{version}, expected at least v{required}")
+            return False
+        print("✅ No read served a stale version past the lag bound")
+        return True
+
+
+def main():
+    harness = MultiWorkerHarness()
+    try:
+        return 0 if harness.run() else 1
+    except KeyboardInterrupt:
+        print("\n⚠️  Harness interrupted by user")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""Graph snapshot harness.
+
+Checks the snapshot file format directly (round trip, bad magic, bad length),
+then runs the backend against a scratch database to check that a snapshot
+left behind by newer writes is reconciled with Mongo on startup, that one
+ahead of a dropped database is discarded, and times the first successful
+/api/graph-data response of a cold start with and without a snapshot.
+
+Requires a reachable MongoDB (MONGO_URL) and the backend requirements.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import requests
+from pymongo import MongoClient
+
+BACKEND_DIR = Path(__file__).parent / "backend"
+PORT = int(os.environ.get("HARNESS_PORT", "8013"))
+SEED_VIEWS = int(os.environ.get("HARNESS_SEED_VIEWS", "5000"))
+COLD_STARTS = int(os.environ.get("HARNESS_COLD_STARTS", "3"))
+MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+DB_NAME = os.environ.get("HARNESS_DB_NAME", "relation_graph_snapshot_test")
+
+os.environ.setdefault("MONGO_URL", MONGO_URL)
+os.environ.setdefault("DB_NAME", DB_NAME)
+sys.path.insert(0, str(BACKEND_DIR))
+from server import GraphCache, SNAPSHOT_HEADER, write_snapshot  # noqa: E402
+
+
+class SnapshotHarness:
+    def __init__(self):
+        self.api_url = f"http://127.0.0.1:{PORT}/api"
+        self.mongo = MongoClient(MONGO_URL)
+        self.workdir = Path(tempfile.mkdtemp(prefix="graph-snapshot-"))
+        self.snapshot = self.workdir / "graph.snapshot"
+        self.server = None
+        self.failures = []
+
+    def check(self, name, ok, detail=""):
+        print(f"{'✅' if ok else '❌'} {name}{f' - {detail}' if detail else ''}")
+        if not ok:
+            self.failures.append(name)
+
+    # ---- snapshot format ----
+
+    def test_format(self):
+        body = json.dumps({"nodes": [{"id": "1"}], "edges": []}).encode()
+        path = self.workdir / "format.snapshot"
+        write_snapshot(path, 7, 1, 0, body)
+
+        cache = GraphCache()
+        loaded = cache.load_snapshot(path)
+        self.check("Snapshot round trip", loaded and cache.version == 7 and bytes(cache.body()) == body)
+        self.check("Snapshot body served from the mapping", isinstance(cache.body(), memoryview))
+
+        raw = path.read_bytes()
+        path.write_bytes(b"NOTASNAP" + raw[8:])
+        self.check("Bad magic rejected", not GraphCache().load_snapshot(path))
+
+        path.write_bytes(raw[:-1])
+        self.check("Truncated body rejected", not GraphCache().load_snapshot(path))
+
+        path.write_bytes(raw + b"x")
+        self.check("Trailing bytes rejected", not GraphCache().load_snapshot(path))
+
+        path.write_bytes(raw[:SNAPSHOT_HEADER.size - 1])
+        self.check("Short header rejected", not GraphCache().load_snapshot(path))
+
+        self.check("Missing file rejected", not GraphCache().load_snapshot(self.workdir / "missing.snapshot"))
+
+    # ---- server ----
+
+    def start_server(self, snapshot):
+        env = {
+            **os.environ,
+            "MONGO_URL": MONGO_URL,
+            "DB_NAME": DB_NAME,
+            "GRAPH_SNAPSHOT_PATH": str(snapshot),
+        }
+        started = time.monotonic()
+        self.server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "server:app", "--port", str(PORT)],
+            cwd=BACKEND_DIR,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        # Poll graph-data itself so the time covers everything before the first useful read
+        while time.monotonic() - started < 30:
+            try:
+                response = requests.get(f"{self.api_url}/graph-data", timeout=5)
+                if response.status_code == 200:
+                    return (time.monotonic() - started) * 1000, response
+            except requests.RequestException:
+                pass
+            time.sleep(0.01)
+        raise RuntimeError("Backend did not start")
+
+    def stop_server(self):
+        if self.server:
+            # SIGTERM lets the shutdown hook persist the snapshot
+            self.server.terminate()
+            self.server.wait(timeout=30)
+            self.server = None
+
+    def graph_version(self):
+        meta = self.mongo[DB_NAME].graph_meta.find_one({"_id": "graph"})
+        return meta["version"] if meta else 0
+
+    def seed(self):
+        sql = ";\n".join(
+            f"INSERT INTO Report_ViewRelation (IdView1, IdView2, Relation) "
+            f"VALUES({i}, {i + 1}, 'JOIN T{i + 1} ON T{i + 1}.Id = T{i}.Id')"
+            for i in range(1, SEED_VIEWS)
+        )
+        requests.post(f"{self.api_url}/import-sql", json={"sql": sql}, timeout=300).raise_for_status()
+
+    def seed_after_drop(self):
+        self.start_server(self.snapshot)
+        self.seed()
+        self.stop_server()
+
+    def test_reconcile_behind(self):
+        self.start_server(self.snapshot)
+        self.seed()
+        self.stop_server()
+        stale = GraphCache()
+        self.check("Snapshot persisted on shutdown", stale.load_snapshot(self.snapshot))
+
+        # Write through a second server with its own snapshot, leaving the first one behind
+        self.start_server(self.workdir / "other.snapshot")
+        requests.post(f"{self.api_url}/views", json={"view_id": 999999, "name": "AfterSnapshot"}, timeout=10)
+        self.stop_server()
+        self.check("Snapshot is behind Mongo", stale.version < self.graph_version(),
+                   f"snapshot v{stale.version}, mongo v{self.graph_version()}")
+
+        _, response = self.start_server(self.snapshot)
+        version = int(response.headers["X-Graph-Version"])
+        names = {node.get("name") for node in response.json()["nodes"]}
+        self.stop_server()
+        self.check("Stale snapshot reconciled before the first read",
+                   version == self.graph_version() and "AfterSnapshot" in names,
+                   f"served v{version}")
+
+    def test_ahead_of_mongo(self):
+        """A snapshot of a database that was since dropped must not be served"""
+        self.check("Snapshot left from the previous database", GraphCache().load_snapshot(self.snapshot))
+        self.mongo.drop_database(DB_NAME)
+        
+        _, response = self.start_server(self.snapshot)
+        version = int(response.headers["X-Graph-Version"])
+        nodes = response.json()["nodes"]
+        self.stop_server()
+        self.check("Snapshot ahead of Mongo discarded", version == 0 and not nodes,
+                   f"served v{version} with {len(nodes)} nodes")
+
+    def test_cold_start(self):
+        timings = {"mongo": [], "snapshot": []}
+        for _ in range(COLD_STARTS):
+            self.snapshot.unlink(missing_ok=True)
+            elapsed, _ = self.start_server(self.snapshot)
+            self.stop_server()
+            timings["mongo"].append(elapsed)
+
+            elapsed, _ = self.start_server(self.snapshot)
+            self.stop_server()
+            timings["snapshot"].append(elapsed)
+
+        for source, values in timings.items():
+            print(f"⏱️  First graph-data from {source}: "
+                  f"median {sorted(values)[len(values) // 2]:.0f} ms over {len(values)} cold starts "
+                  f"({SEED_VIEWS} views)")
+        return timings
+
+    def run(self):
+        self.test_format()
+        self.mongo.drop_database(DB_NAME)
+        try:
+            self.test_reconcile_behind()
+            self.test_ahead_of_mongo()
+            self.seed_after_drop()
+            self.test_cold_start()
+        finally:
+            self.stop_server()
+            self.mongo.drop_database(DB_NAME)
+
+        if self.failures:
+            print(f"❌ {len(self.failures)} snapshot checks failed")
+            return False
+        print("✅ All snapshot checks passed")
+        return True
+
+
+def main():
+    harness = SnapshotHarness()
+    try:
+        return 0 if harness.run() else 1
+    except KeyboardInterrupt:
+        print("\n⚠️  Harness interrupted by user")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
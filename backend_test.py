@@ -26,11 +26,11 @@ class DatabaseGraphAPITester:
             if method == 'GET':
                 response = requests.get(url, headers=headers, params=params, timeout=10)
             elif method == 'POST':
-                response = requests.post(url, json=data, headers=headers, timeout=10)
+                response = requests.post(url, json=data, headers=headers, params=params, timeout=10)
             elif method == 'PUT':
-                response = requests.put(url, json=data, headers=headers, timeout=10)
+                response = requests.put(url, json=data, headers=headers, params=params, timeout=10)
             elif method == 'DELETE':
-                response = requests.delete(url, headers=headers, timeout=10)
+                response = requests.delete(url, headers=headers, params=params, timeout=10)
 
             success = response.status_code == expected_status
             if success:
@@ -69,9 +69,61 @@ class DatabaseGraphAPITester:
         if success and isinstance(response, dict):
             if 'views_count' in response and 'relations_count' in response:
                 print(f"   📊 Views: {response.get('views_count')}, Relations: {response.get('relations_count')}")
+                print(f"   📊 Placeholders: {response.get('placeholder_views')}, Join types: {response.get('join_types')}")
+                print(f"   📊 Degree histogram: {response.get('degree_histogram')}")
                 return True
         return False
 
+    def check_stats(self, step, views, relations, placeholders, degrees, join_types):
+        """Compare the maintained stats with the counts expected after a step"""
+        success, stats = self.run_test(f"Stats After {step}", "GET", "stats", 200)
+        if not success:
+            return False
+        expected = {
+            "views_count": views,
+            "relations_count": relations,
+            "placeholder_views": placeholders,
+            "degree_histogram": degrees,
+            "join_types": join_types
+        }
+        actual = {k: stats.get(k) for k in expected}
+        if sum(stats.get('view_version_spreads', {}).values()) != views:
+            actual["view_version_spreads"] = stats.get('view_version_spreads')
+        if actual != expected:
+            self.errors.append(f"Stats after {step}: expected {expected}, got {actual}")
+            print(f"❌ Stats after {step}: expected {expected}, got {actual}")
+            return False
+        return True
+
+    def test_stats_maintenance(self):
+        """Test the maintained counters against create, delete, import and clear"""
+        self.run_test("Clear Before Stats", "DELETE", "clear-all", 200)
+        if not self.check_stats("Clear", 0, 0, 0, {}, {}):
+            return False
+        
+        # View 3 only appears in a relation, so the import creates it as a placeholder
+        sql = """
+INSERT INTO Report_View (IdView, Name) VALUES(1, 'One');
+INSERT INTO Report_View (IdView, Name) VALUES(2, 'Two');
+INSERT INTO Report_ViewRelation (IdView1, IdView2, Relation) VALUES(1, 2, 'LEFT JOIN Two ON Two.Id = One.TwoId');
+INSERT INTO Report_ViewRelation (IdView1, IdView2, Relation) VALUES(2, 3, 'JOIN Three ON Three.Id = Two.ThreeId');
+"""
+        self.run_test("Import For Stats", "POST", "import-sql", 200, data={"sql": sql})
+        if not self.check_stats("Import", 3, 2, 1, {"1": 2, "2": 1}, {"LEFT JOIN": 1, "JOIN": 1}):
+            return False
+        
+        self.run_test("Create View For Stats", "POST", "views", 200, data={"view_id": 4, "name": "Four"})
+        if not self.check_stats("Create", 4, 2, 1, {"0": 1, "1": 2, "2": 1}, {"LEFT JOIN": 1, "JOIN": 1}):
+            return False
+        
+        # Deleting view 2 also deletes both of its relations
+        self.run_test("Delete View For Stats", "DELETE", "views/2", 200)
+        if not self.check_stats("Delete", 3, 0, 1, {"0": 3}, {}):
+            return False
+        
+        self.run_test("Clear After Stats", "DELETE", "clear-all", 200)
+        return self.check_stats("Final Clear", 0, 0, 0, {}, {})
+
     def test_clear_all_data(self):
         """Clear all existing data for clean testing"""
         success, response = self.run_test(
@@ -168,6 +220,54 @@ INSERT INTO Report_ViewRelation (IdView1, IdView2, Relation, EdgeWeight) VALUES(
             return True
         return False
 
+    def read_metrics(self):
+        response = requests.get(f"{self.api_url}/metrics", timeout=10)
+        return response.json() if response.status_code == 200 else {}
+
+    def test_concurrent_graph_data(self, rounds=5, readers=20):
+        """Test concurrent /api/graph-data reads after a write share one rebuild"""
+        from concurrent.futures import ThreadPoolExecutor
+        import threading
+        
+        self.tests_run += 1
+        print(f"\n🔍 Testing Concurrent Graph Data...")
+        joined_before = self.read_metrics().get('single_flight', {}).get('joined', 0)
+        statuses = []
+        
+        def read(barrier):
+            barrier.wait()
+            return requests.get(f"{self.api_url}/graph-data", timeout=10).status_code
+        
+        # A write makes the cached graph stale, so the next burst has to rebuild it
+        for i in range(rounds):
+            requests.post(f"{self.api_url}/views", json={"view_id": 990000 + i, "name": f"Burst_{i}"}, timeout=10)
+            barrier = threading.Barrier(readers)
+            with ThreadPoolExecutor(max_workers=readers) as pool:
+                statuses += list(pool.map(lambda _: read(barrier), range(readers)))
+            requests.delete(f"{self.api_url}/views/{990000 + i}", timeout=10)
+            joined = self.read_metrics().get('single_flight', {}).get('joined', 0)
+            if joined > joined_before:
+                break
+        
+        # 503 is an acceptable answer under load shedding
+        if not all(status in (200, 503) for status in statuses) or 200 not in statuses:
+            self.errors.append(f"Concurrent Graph Data: unexpected statuses {statuses}")
+            print(f"❌ Failed - Statuses: {statuses}")
+            return False
+        if joined <= joined_before:
+            self.errors.append("Concurrent Graph Data: no read joined an in-flight rebuild")
+            print(f"❌ Failed - single_flight.joined stayed at {joined}")
+            return False
+        self.tests_passed += 1
+        print(f"✅ Passed - {joined - joined_before} reads joined an in-flight rebuild")
+        
+        response = self.read_metrics()
+        flight = response.get('single_flight', {})
+        print(f"   📈 Leaders: {flight.get('leaders')}, joined: {flight.get('joined')}, shed: {response.get('reads', {}).get('shed')}")
+        startup = response.get('startup', {})
+        print(f"   ⏱️  Startup from {startup.get('source')}: ready {startup.get('ready_ms')} ms, first graph read {startup.get('first_graph_read_ms')} ms")
+        return True
+
     def test_create_view(self):
         """Test creating a new view"""
         test_view = {
@@ -197,10 +297,34 @@ INSERT INTO Report_ViewRelation (IdView1, IdView2, Relation, EdgeWeight) VALUES(
                 data=test_view
             )
             
-            if success_dup:
-                print("   ✅ Duplicate view rejection works")
+            if not success_dup:
+                return False
+            print("   ✅ Duplicate view rejection works")
             
+            return self.test_concurrent_create_view()
+        return False
+
+    def test_concurrent_create_view(self, writers=10):
+        """Test that racing creates of one view_id store it exactly once"""
+        from concurrent.futures import ThreadPoolExecutor
+        view = {"view_id": 997, "name": "Racing_View"}
+        
+        def create(_):
+            return requests.post(f"{self.api_url}/views", json=view, timeout=10).status_code
+        
+        self.tests_run += 1
+        print("\n🔍 Testing Concurrent Duplicate Creates...")
+        with ThreadPoolExecutor(max_workers=writers) as pool:
+            statuses = list(pool.map(create, range(writers)))
+        stored = requests.get(f"{self.api_url}/views", params={"view_id": 997}, timeout=10).json()
+        requests.delete(f"{self.api_url}/views/997", timeout=10)
+        
+        if statuses.count(200) == 1 and statuses.count(400) == writers - 1 and len(stored) == 1:
+            self.tests_passed += 1
+            print("✅ Passed - one create stored, the rest rejected with 400")
             return True
+        print(f"❌ Failed - statuses {sorted(statuses)}, {len(stored)} stored")
+        self.errors.append("Concurrent Duplicate Creates")
         return False
 
     def test_create_relation(self):
@@ -240,6 +364,276 @@ INSERT INTO Report_ViewRelation (IdView1, IdView2, Relation, EdgeWeight) VALUES(
             return True
         return False
 
+    def test_change_feed(self):
+        """Test /api/changes streams a patch after a write"""
+        self.tests_run += 1
+        print(f"\n🔍 Testing Change Feed...")
+        
+        try:
+            with requests.get(f"{self.api_url}/changes", stream=True, timeout=10) as stream:
+                lines = stream.iter_lines(decode_unicode=True)
+                # Wait for the ready event before writing
+                for line in lines:
+                    if line.startswith("data:"):
+                        break
+                
+                requests.put(f"{self.api_url}/views/999", json={"alias": "TestV2"}, timeout=10)
+                
+                event = None
+                for line in lines:
+                    if line.startswith("event:"):
+                        event = line.split(":", 1)[1].strip()
+                    elif line.startswith("data:") and event == "patch":
+                        patches = json.loads(line.split(":", 1)[1])["patches"]
+                        if any(p.get("key") == "999" and p.get("op") == "upsert" for p in patches):
+                            self.tests_passed += 1
+                            print("✅ Passed - View update received")
+                            return True
+                        break
+        except Exception as e:
+            print(f"❌ Failed - Error: {str(e)}")
+        
+        self.errors.append("Change Feed: view update patch not received")
+        return False
+
+    def test_join_filters(self):
+        """Test filtering relations by extracted JOIN metadata"""
+        success, response = self.run_test(
+            "Filter Relations by Join Type",
+            "GET",
+            "relations",
+            200,
+            params={"join_type": "inner"}
+        )
+        
+        if not success:
+            return False
+        
+        relations = response if isinstance(response, list) else []
+        print(f"   📋 Found {len(relations)} INNER JOIN relations")
+        if any(r.get('join_type') != 'INNER JOIN' for r in relations):
+            print("   ⚠️  Filter returned relations of another join type")
+            return False
+        
+        success, response = self.run_test(
+            "Filter Graph by Join Column",
+            "GET",
+            "graph-data",
+            200,
+            params={"join_column": "CountryIsoCode"}
+        )
+        
+        if not success or not isinstance(response, dict):
+            return False
+        print(f"   📊 Graph nodes: {len(response.get('nodes', []))}, edges: {len(response.get('edges', []))}")
+        
+        # OUTER joins and aliases: the aliased other side is not a table
+        success, view = self.run_test("Create Join Test View", "POST", "views", 200, data={"view_id": 998, "name": "JoinTest"})
+        success, relation = self.run_test(
+            "Create Aliased Outer Join",
+            "POST",
+            "relations",
+            200,
+            data={"id_view1": 998, "id_view2": 998, "relation": "LEFT OUTER JOIN DBCommon.Shop s ON s.Id = v.ShopId"}
+        )
+        if not success:
+            return False
+        cases = [
+            (relation, {"join_type": "LEFT JOIN", "join_tables": ["shop"], "join_columns": ["id", "shopid"]}),
+        ]
+        
+        # An unaliased JOIN target against an aliased other side: v is still not a table
+        success, relation = self.run_test(
+            "Create Unaliased Join",
+            "POST",
+            "relations",
+            200,
+            data={"id_view1": 998, "id_view2": 998, "relation": "LEFT JOIN Shop ON Shop.Id = v.ShopId"}
+        )
+        cases.append((relation, {"join_type": "LEFT JOIN", "join_tables": ["shop"], "join_columns": ["id", "shopid"]}))
+        
+        # The predicate ends at WHERE, so filter columns are not join columns
+        success, relation = self.run_test(
+            "Create Join With Where",
+            "POST",
+            "relations",
+            200,
+            data={"id_view1": 998, "id_view2": 998, "relation": "JOIN x ON x.id = y.id WHERE x.a = 1"}
+        )
+        cases.append((relation, {"join_type": "JOIN", "join_tables": ["x"], "join_columns": ["id"]}))
+        
+        self.run_test("Delete Join Test View", "DELETE", "views/998", 200)
+        ok = True
+        for relation, expected in cases:
+            actual = {k: (relation or {}).get(k) for k in expected}
+            if actual != expected:
+                self.errors.append(f"Join metadata: expected {expected}, got {actual}")
+                print(f"❌ Join metadata: expected {expected}, got {actual}")
+                ok = False
+        if ok:
+            print("   ✅ Join metadata excludes aliases and WHERE columns")
+        return ok
+
+    def test_undo_redo(self):
+        """Test undoing and redoing the last change"""
+        def graph_state(label):
+            success, stats = self.run_test(f"Stats {label}", "GET", "stats", 200)
+            success_graph, graph = self.run_test(f"Graph {label}", "GET", "graph-data", 200)
+            if not success or not success_graph:
+                return None
+            stats.pop('reconciled_at', None)
+            return stats, sorted(n['id'] for n in graph['nodes']), sorted(e['id'] for e in graph['edges'])
+        
+        before = graph_state("Before Undo")
+        if before is None:
+            return False
+        
+        success, response = self.run_test(
+            "Undo Last Change",
+            "POST",
+            "history/undo",
+            200
+        )
+        if not success:
+            return False
+        print(f"   ↩️  Undid version {response.get('undone')}")
+        
+        undone = graph_state("After Undo")
+        if undone is None or undone == before:
+            self.errors.append("Undo left the graph and stats unchanged")
+            print("❌ Undo left the graph and stats unchanged")
+            return False
+        
+        success, response = self.run_test(
+            "Redo Last Change",
+            "POST",
+            "history/redo",
+            200
+        )
+        if not success:
+            return False
+        
+        after = graph_state("After Redo")
+        if after != before:
+            self.errors.append("Redo did not restore the graph and stats from before the undo")
+            print("❌ Redo did not restore the graph and stats from before the undo")
+            return False
+        print("   ✅ Undo changed the graph and redo restored it")
+        
+        success, response = self.run_test(
+            "Graph at Previous Version",
+            "GET",
+            "history/graph",
+            200,
+            params={"version": response.get('version', 1) - 1}
+        )
+        if success and isinstance(response, dict):
+            print(f"   📊 v{response.get('version')}: {len(response.get('nodes', []))} nodes, {len(response.get('edges', []))} edges")
+            return True
+        return False
+
+    def test_projects(self):
+        """Test cloning a project and keeping its writes out of the source"""
+        clone = {"project": "test-clone"}
+        success, response = self.run_test(
+            "Clone Default Project",
+            "POST",
+            "projects/default/clone",
+            200,
+            data={"key": "test-clone", "name": "Test Clone"}
+        )
+        if not success:
+            return False
+        print(f"   🧬 Cloned default at v{response.get('clone_version')}")
+        
+        success, source = self.run_test("Default Graph Data", "GET", "graph-data", 200)
+        success, cloned = self.run_test("Clone Graph Data", "GET", "graph-data", 200, params=clone)
+        if not success or len(cloned.get('nodes', [])) != len(source.get('nodes', [])):
+            print("❌ Clone does not match its source")
+            return False
+        
+        success, source_stats = self.run_test("Default Stats", "GET", "stats", 200)
+        success, clone_stats = self.run_test("Clone Stats", "GET", "stats", 200, params=clone)
+        if success and clone_stats.get('views_count') != source_stats.get('views_count'):
+            print("❌ Clone stats do not match its source")
+            return False
+        self.run_test("Clone Views", "GET", "views", 200, params=clone)
+        self.run_test("Clone History", "GET", "history", 200, params=clone)
+        
+        # Reads are served from the source; only a write copies the data
+        success, projects = self.run_test("List Projects", "GET", "projects", 200)
+        pending = next((p for p in projects if p['key'] == 'test-clone'), {})
+        if pending.get('materialized'):
+            print("❌ Reading the clone copied its data")
+            return False
+        print("   ✅ Reads left the clone uncopied")
+        
+        success, _ = self.run_test(
+            "Create View In Clone",
+            "POST",
+            "views",
+            200,
+            data={"view_id": 99999, "name": "CloneOnlyView"},
+            params=clone
+        )
+        success, response = self.run_test("Default Views Unchanged", "GET", "views", 200, params={"view_id": 99999})
+        if success and response:
+            print("❌ Write to the clone leaked into the default project")
+            return False
+        
+        success, response = self.run_test("Export Clone", "GET", "export", 200, params=clone)
+        if success and "CloneOnlyView" in response.get('sql', ''):
+            print(f"   📤 Exported {response['sql'].count('INSERT')} statements")
+        
+        success, _ = self.run_test("Delete Test Clone", "DELETE", "projects/test-clone", 200)
+        return success
+
+    def test_export_round_trip(self):
+        """Test that an export imports back unchanged, including awkward values"""
+        source = {"project": "test-export"}
+        target = {"project": "test-import"}
+        tricky = "Isn't \"quoted\"; (a), b in C:\\dir\\"
+        self.run_test("Create Export Project", "POST", "projects", 200, data={"key": "test-export", "name": "Export"})
+        self.run_test("Create Import Project", "POST", "projects", 200, data={"key": "test-import", "name": "Import"})
+        self.run_test("Create Tricky View", "POST", "views", 200,
+                      data={"view_id": 1, "name": tricky, "alias": "a'b"}, params=source)
+        self.run_test("Create Plain View", "POST", "views", 200, data={"view_id": 2, "name": "Plain"}, params=source)
+        self.run_test("Create Tricky Relation", "POST", "relations", 200, params=source, data={
+            "id_view1": 1, "id_view2": 2,
+            "relation": "LEFT JOIN t2 ON t2.x = ')' AND t2.y = ';'",
+            "relation2": tricky
+        })
+        
+        success, exported = self.run_test("Export Tricky Project", "GET", "export", 200, params=source)
+        ok = False
+        if success:
+            success, _ = self.run_test("Import Export", "POST", "import-sql", 200,
+                                       data={"sql": exported['sql']}, params=target)
+            _, views = self.run_test("Views After Round Trip", "GET", "views", 200, params=target)
+            _, relations = self.run_test("Relations After Round Trip", "GET", "relations", 200, params=target)
+            names = {v['view_id']: (v.get('name'), v.get('alias')) for v in views or []}
+            ok = (
+                names == {1: (tricky, "a'b"), 2: ("Plain", None)}
+                and len(relations or []) == 1
+                and relations[0].get('relation') == "LEFT JOIN t2 ON t2.x = ')' AND t2.y = ';'"
+                and relations[0].get('relation2') == tricky
+            )
+            print(f"   {'✅' if ok else '❌'} Export round trip {'preserved' if ok else 'changed'} quotes, ';' and ')'")
+        
+        # Hand-written scripts may escape quotes with a backslash; unparseable inserts are reported
+        success, result = self.run_test("Import Backslash Escapes", "POST", "import-sql", 200, params=target, data={
+            "sql": "INSERT INTO Report_View (IdView, Name) VALUES(3, 'it\\'s');\n"
+                   "INSERT INTO Report_View (IdView, Name) VALUES(4, 'unterminated"
+        })
+        _, escaped = self.run_test("Backslash Escaped View", "GET", "views/3", 200, params=target)
+        if not success or (escaped or {}).get('name') != "it's" or len(result.get('errors', [])) != 1:
+            print(f"❌ Backslash import: view {escaped}, errors {result.get('errors') if success else None}")
+            ok = False
+        
+        self.run_test("Delete Export Project", "DELETE", "projects/test-export", 200)
+        self.run_test("Delete Import Project", "DELETE", "projects/test-import", 200)
+        return ok
+
     def run_all_tests(self):
         """Run all API tests"""
         print("🚀 Starting Database Graph API Tests...")
@@ -253,6 +647,9 @@ INSERT INTO Report_ViewRelation (IdView1, IdView2, Relation, EdgeWeight) VALUES(
         # Clear existing data for clean testing
         self.test_clear_all_data()
         
+        # Test maintained stats stay exact across writes
+        self.test_stats_maintenance()
+        
         # Test SQL import functionality
         if not self.test_import_sql():
             print("❌ SQL import failed, continuing with other tests")
@@ -263,10 +660,27 @@ INSERT INTO Report_ViewRelation (IdView1, IdView2, Relation, EdgeWeight) VALUES(
         # Test graph data endpoint
         self.test_graph_data_endpoint()
         
+        self.test_concurrent_graph_data()
+        
         # Test create operations
         self.test_create_view()
         self.test_create_relation()
         
+        # Test JOIN metadata filters
+        self.test_join_filters()
+        
+        # Test undo/redo history
+        self.test_undo_redo()
+        
+        # Test change feed
+        self.test_change_feed()
+        
+        # Test project cloning and isolation
+        self.test_projects()
+        
+        # Test export/import round trip
+        self.test_export_round_trip()
+        
         # Test relations endpoint
         self.test_relations_endpoint()
         
@@ -96,6 +96,49 @@ const normalizeEdge = (relation) => ({
   edge_weight: Number(relation.edge_weight ?? 10),
 });
 
+// Checked in order; must match JOIN_TYPE_PATTERNS in backend/server.py so the
+// colour of an edge agrees with the backend's join_type filters
+const JOIN_TYPE_PATTERNS = [
+  ["LEFT JOIN", /\bLEFT\s+(?:OUTER\s+)?JOIN\b/i],
+  ["RIGHT JOIN", /\bRIGHT\s+(?:OUTER\s+)?JOIN\b/i],
+  ["INNER JOIN", /\bINNER\s+JOIN\b/i],
+  ["CROSS JOIN", /\bCROSS\s+JOIN\b/i],
+  ["FULL JOIN", /\bFULL\s+(?:OUTER\s+)?JOIN\b/i],
+  ["JOIN", /\bJOIN\b/i],
+];
+
+// Apply change feed patches (see /api/changes) to normalized graph data
+const applyGraphPatches = (nodes, edges, patches) => {
+  let nextNodes = nodes;
+  let nextEdges = edges;
+
+  patches.forEach((patch) => {
+    if (patch.op === "reset") {
+      nextNodes = [];
+      nextEdges = [];
+      return;
+    }
+
+    if (patch.entity === "view") {
+      nextNodes = nextNodes.filter((node) => node.id !== patch.key);
+      if (patch.op === "upsert") {
+        nextNodes = [...nextNodes, normalizeNode(patch.data)];
+      } else {
+        nextEdges = nextEdges.filter(
+          (edge) => edge.source !== patch.key && edge.target !== patch.key,
+        );
+      }
+    } else if (patch.entity === "relation") {
+      nextEdges = nextEdges.filter((edge) => edge.id !== patch.key);
+      if (patch.op === "upsert") {
+        nextEdges = [...nextEdges, normalizeEdge(patch.data)];
+      }
+    }
+  });
+
+  return { nodes: nextNodes, edges: nextEdges };
+};
+
 const splitSqlValues = (valuesStr) => {
   const values = [];
   let current = "";
@@ -113,6 +156,12 @@ const splitSqlValues = (valuesStr) => {
       continue;
     }
 
+    if (inString && char === "\\" && nextChar !== undefined) {
+      current += char + nextChar;
+      i += 1;
+      continue;
+    }
+
     if (inString && char === quoteChar) {
       if (quoteChar === "'" && nextChar === "'") {
         current += "''";
@@ -138,6 +187,10 @@ const splitSqlValues = (valuesStr) => {
   return values;
 };
 
+// Quotes doubled and backslashes escaped, as the backend export writes them
+const sqlString = (value) =>
+  `'${value.replace(/\\/g, "\\\\").replace(/'/g, "''")}'`;
+
 const cleanSqlValue = (rawValue) => {
   if (rawValue == null) return null;
   const trimmed = rawValue.trim();
@@ -147,7 +200,9 @@ const cleanSqlValue = (rawValue) => {
     (trimmed.startsWith("'") && trimmed.endsWith("'")) ||
     (trimmed.startsWith('"') && trimmed.endsWith('"'))
   ) {
-    return trimmed.slice(1, -1).replace(/''/g, "'");
+    return trimmed
+      .slice(1, -1)
+      .replace(/\\(['"\\])|''/g, (match, escaped) => escaped || "'");
   }
 
   return trimmed;
@@ -416,18 +471,13 @@ export const AppProvider = ({ children }) => {
     }));
   }, []);
 
-  // Get join type from relation string
+  // Get join type from relation string (same patterns as JOIN_TYPE_PATTERNS in the backend)
   const getJoinType = useCallback((relationStr) => {
     if (!relationStr) return "DEFAULT";
-    const upper = relationStr.toUpperCase();
-    if (upper.includes("LEFT JOIN")) return "LEFT JOIN";
-    if (upper.includes("RIGHT JOIN")) return "RIGHT JOIN";
-    if (upper.includes("INNER JOIN")) return "INNER JOIN";
-    if (upper.includes("CROSS JOIN")) return "CROSS JOIN";
-    if (upper.includes("FULL JOIN") || upper.includes("FULL OUTER"))
-      return "FULL JOIN";
-    if (upper.includes("JOIN")) return "JOIN";
-    return "DEFAULT";
+    const match = JOIN_TYPE_PATTERNS.find(([, pattern]) =>
+      pattern.test(relationStr),
+    );
+    return match ? match[0] : "DEFAULT";
   }, []);
 
   // Get color for join type
@@ -577,10 +627,18 @@ export const AppProvider = ({ children }) => {
     [shouldUseLocalFallback],
   );
 
+  // Change feed bookkeeping: the graph version currently shown, patches that
+  // arrived while a full fetch was in flight, and whether the feed is live
+  const graphVersionRef = useRef(null);
+  const pendingPatchesRef = useRef([]);
+  const fetchesInFlightRef = useRef(0);
+  const feedOpenRef = useRef(false);
+
   // Fetch data
   const fetchData = useCallback(async () => {
     setLoading(true);
     setError(null);
+    fetchesInFlightRef.current += 1;
     try {
       if (!HAS_BACKEND_CONFIG) {
         const localData = loadLocalGraphData();
@@ -593,12 +651,25 @@ export const AppProvider = ({ children }) => {
         axios.get(`${API}/stats`),
       ]);
 
-      applyGraphData(
-        graphRes.data.nodes || [],
-        graphRes.data.edges || [],
-        "server",
-        statsRes.data,
-      );
+      // Replay only the buffered patches newer than the fetched graph
+      const version = Number(graphRes.headers?.["x-graph-version"]);
+      let nodes = (graphRes.data.nodes || []).map(normalizeNode);
+      let edges = (graphRes.data.edges || []).map(normalizeEdge);
+      let latest = Number.isFinite(version) ? version : null;
+      pendingPatchesRef.current
+        .filter((batch) => latest === null || batch.seq > latest)
+        .forEach((batch) => {
+          ({ nodes, edges } = applyGraphPatches(nodes, edges, batch.patches));
+          latest = Math.max(latest ?? batch.seq, batch.seq);
+        });
+      pendingPatchesRef.current = [];
+      graphVersionRef.current = latest;
+
+      applyGraphData(nodes, edges, "server", {
+        ...statsRes.data,
+        views_count: nodes.length,
+        relations_count: edges.length,
+      });
     } catch (err) {
       console.error("Error fetching data:", err);
       if (shouldUseLocalFallback(err)) {
@@ -608,6 +679,7 @@ export const AppProvider = ({ children }) => {
         setError("Error carregant les dades");
       }
     } finally {
+      fetchesInFlightRef.current -= 1;
       setLoading(false);
     }
   }, [applyGraphData, loadLocalGraphData, shouldUseLocalFallback]);
@@ -617,6 +689,75 @@ export const AppProvider = ({ children }) => {
     fetchData();
   }, [fetchData]);
 
+  // Keep the latest graph reachable from the change feed listener
+  const graphRef = useRef({ views: [], relations: [] });
+  useEffect(() => {
+    graphRef.current = { views, relations };
+  }, [views, relations]);
+
+  // Apply writes made from other tabs/clients as they happen
+  useEffect(() => {
+    if (!HAS_BACKEND_CONFIG || typeof EventSource === "undefined") return;
+
+    const source = new EventSource(`${API}/changes`);
+    source.addEventListener("ready", (event) => {
+      feedOpenRef.current = true;
+      // Writes between the last fetch and this subscription were not streamed
+      const seq = Number(safeParse(event.data, null)?.seq);
+      const known = graphVersionRef.current;
+      if (fetchesInFlightRef.current === 0 && known !== null && seq > known) {
+        fetchData();
+      }
+    });
+    source.addEventListener("error", () => {
+      feedOpenRef.current = false;
+    });
+    source.addEventListener("patch", (event) => {
+      const payload = safeParse(event.data, null);
+      const patches = payload?.patches || [];
+      const seq = Number(payload?.seq ?? event.lastEventId);
+      if (patches.some((patch) => patch.op === "resync")) {
+        fetchData();
+        return;
+      }
+      if (fetchesInFlightRef.current > 0) {
+        pendingPatchesRef.current.push({ seq, patches });
+        return;
+      }
+      if (graphVersionRef.current !== null && seq <= graphVersionRef.current) {
+        return;
+      }
+      graphVersionRef.current = seq;
+
+      const { nodes, edges } = applyGraphPatches(
+        graphRef.current.views,
+        graphRef.current.relations,
+        patches,
+      );
+      graphRef.current = { views: nodes, relations: edges };
+      setViews(nodes);
+      setRelations(edges);
+      setStats((prev) => ({
+        ...prev,
+        views_count: nodes.length,
+        relations_count: edges.length,
+      }));
+      saveLocalGraphData(nodes, edges);
+    });
+
+    return () => {
+      feedOpenRef.current = false;
+      source.close();
+    };
+  }, [fetchData, saveLocalGraphData]);
+
+  // Server writes reach this tab through the change feed; refetch only without it
+  const syncAfterWrite = useCallback(async () => {
+    if (!feedOpenRef.current) {
+      await fetchData();
+    }
+  }, [fetchData]);
+
   // Keep selected entities in sync with refreshed graph data.
   useEffect(() => {
     if (!selectedView) return;
@@ -794,7 +935,7 @@ export const AppProvider = ({ children }) => {
             setOriginalImportedIds({ views: viewIds, relations: relationIds });
           }
 
-          await fetchData();
+          await syncAfterWrite();
           return response.data;
         },
         async () => {
@@ -895,14 +1036,14 @@ export const AppProvider = ({ children }) => {
         },
       );
     },
-    [applyGraphData, fetchData, relations, runWithLocalFallback, views],
+    [applyGraphData, syncAfterWrite, relations, runWithLocalFallback, views],
   );
 
   // Export view as SQL
   const exportViewAsSql = useCallback((view, type = "INSERT") => {
-    const name = view.name ? `'${view.name.replace(/'/g, "''")}'` : "NULL";
-    const name2 = view.name2 ? `'${view.name2.replace(/'/g, "''")}'` : "NULL";
-    const alias = view.alias ? `'${view.alias.replace(/'/g, "''")}'` : "NULL";
+    const name = view.name ? sqlString(view.name) : "NULL";
+    const name2 = view.name2 ? sqlString(view.name2) : "NULL";
+    const alias = view.alias ? sqlString(view.alias) : "NULL";
     const minAppVersion = toIntOrDefault(view.min_app_version, 0);
     const maxAppVersion = toIntOrDefault(view.max_app_version, 999999);
 
@@ -916,12 +1057,8 @@ export const AppProvider = ({ children }) => {
   // Export relation as SQL
   const exportRelationAsSql = useCallback(
     (relation, type = "INSERT") => {
-      const rel1 = relation.relation
-        ? `'${relation.relation.replace(/'/g, "''")}'`
-        : "NULL";
-      const rel2 = relation.relation2
-        ? `'${relation.relation2.replace(/'/g, "''")}'`
-        : "NULL";
+      const rel1 = relation.relation ? sqlString(relation.relation) : "NULL";
+      const rel2 = relation.relation2 ? sqlString(relation.relation2) : "NULL";
       const weight = relation.edge_weight || 10;
       const idView1 = relation.source || relation.id_view1;
       const idView2 = relation.target || relation.id_view2;
@@ -947,7 +1084,7 @@ export const AppProvider = ({ children }) => {
       return runWithLocalFallback(
         async () => {
           await axios.post(`${API}/views`, viewData);
-          await fetchData();
+          await syncAfterWrite();
         },
         async () => {
           const numericViewId = Number(viewData.view_id);
@@ -972,7 +1109,7 @@ export const AppProvider = ({ children }) => {
         },
       );
     },
-    [applyGraphData, fetchData, relations, runWithLocalFallback, views],
+    [applyGraphData, syncAfterWrite, relations, runWithLocalFallback, views],
   );
 
   const updateView = useCallback(
@@ -980,7 +1117,7 @@ export const AppProvider = ({ children }) => {
       return runWithLocalFallback(
         async () => {
           await axios.put(`${API}/views/${viewId}`, updateData);
-          await fetchData();
+          await syncAfterWrite();
         },
         async () => {
           const numericViewId = Number(viewId);
@@ -1014,7 +1151,7 @@ export const AppProvider = ({ children }) => {
         },
       );
     },
-    [applyGraphData, fetchData, relations, runWithLocalFallback, views],
+    [applyGraphData, syncAfterWrite, relations, runWithLocalFallback, views],
   );
 
   const deleteView = useCallback(
@@ -1025,7 +1162,7 @@ export const AppProvider = ({ children }) => {
           if (selectedView?.view_id === viewId) {
             setSelectedView(null);
           }
-          await fetchData();
+          await syncAfterWrite();
         },
         async () => {
           const numericViewId = Number(viewId);
@@ -1047,7 +1184,7 @@ export const AppProvider = ({ children }) => {
         },
       );
     },
-    [applyGraphData, fetchData, relations, runWithLocalFallback, selectedView, views],
+    [applyGraphData, syncAfterWrite, relations, runWithLocalFallback, selectedView, views],
   );
 
   const createRelation = useCallback(
@@ -1055,7 +1192,7 @@ export const AppProvider = ({ children }) => {
       return runWithLocalFallback(
         async () => {
           await axios.post(`${API}/relations`, relationData);
-          await fetchData();
+          await syncAfterWrite();
         },
         async () => {
           const idView1 = Number(relationData.id_view1);
@@ -1086,7 +1223,7 @@ export const AppProvider = ({ children }) => {
         },
       );
     },
-    [applyGraphData, fetchData, relations, runWithLocalFallback, views],
+    [applyGraphData, syncAfterWrite, relations, runWithLocalFallback, views],
   );
 
   const updateRelation = useCallback(
@@ -1094,7 +1231,7 @@ export const AppProvider = ({ children }) => {
       return runWithLocalFallback(
         async () => {
           await axios.put(`${API}/relations/${relationId}`, updateData);
-          await fetchData();
+          await syncAfterWrite();
         },
         async () => {
           const exists = relations.some((r) => r.id === relationId);
@@ -1114,7 +1251,7 @@ export const AppProvider = ({ children }) => {
         },
       );
     },
-    [applyGraphData, fetchData, relations, runWithLocalFallback, views],
+    [applyGraphData, syncAfterWrite, relations, runWithLocalFallback, views],
   );
 
   const deleteRelation = useCallback(
@@ -1125,7 +1262,7 @@ export const AppProvider = ({ children }) => {
           if (selectedRelation?.id === relationId) {
             setSelectedRelation(null);
           }
-          await fetchData();
+          await syncAfterWrite();
         },
         async () => {
           const updatedRelations = relations.filter((r) => r.id !== relationId);
@@ -1141,7 +1278,7 @@ export const AppProvider = ({ children }) => {
         },
       );
     },
-    [applyGraphData, fetchData, relations, runWithLocalFallback, selectedRelation, views],
+    [applyGraphData, syncAfterWrite, relations, runWithLocalFallback, selectedRelation, views],
   );
 
   const clearAllData = useCallback(async () => {
@@ -1155,7 +1292,7 @@ export const AppProvider = ({ children }) => {
         clearFilters();
         setOriginalImportedIds({ views: [], relations: [] });
         setLastImportedSql("");
-        await fetchData();
+        await syncAfterWrite();
       },
       async () => {
         setSelectedView(null);
@@ -1173,7 +1310,7 @@ export const AppProvider = ({ children }) => {
     clearConnectionMode,
     clearFilters,
     clearPathfinding,
-    fetchData,
+    syncAfterWrite,
     runWithLocalFallback,
   ]);
 
@@ -1203,7 +1340,7 @@ export const AppProvider = ({ children }) => {
           setSelectedRelation(null);
         }
 
-        await fetchData();
+        await syncAfterWrite();
       },
       async () => {
         const newViewIdSet = new Set(newViews.map((v) => v.view_id));
@@ -1236,7 +1373,7 @@ export const AppProvider = ({ children }) => {
     applyGraphData,
     isNewRelation,
     isNewView,
-    fetchData,
+    syncAfterWrite,
     relations,
     runWithLocalFallback,
     newViews,